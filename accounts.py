@@ -0,0 +1,138 @@
+"""
+Merging of anonymous activity into accounts, and deletion of accounts.
+
+Progress, quiz attempts and code submissions made before logging in belong
+to the browser session.  At login and registration they are moved to the
+account with set-based statements (see merge_anonymous_activity).
+
+Deleting a User removes their progress, quiz attempts and code submissions
+in the same DELETE statement, through ON DELETE CASCADE.  Accounts with more
+than USER_DELETE_ASYNC_ROWS rows are deleted in the background instead: the
+account is blocked at once, its rows are deleted USER_DELETE_BATCH at a time,
+each batch in its own short transaction, and the user row goes last.  The
+block marks the deletion as pending, so deletions cut short by a restart are
+queued again at start-up (see resume_deletions).
+"""
+
+import logging
+import os
+
+from app import app, db
+from job_queue import JobQueue, QueueFull
+from models import User, UserProgress, QuizAttempt, CodeSubmission
+from progress import move_session_progress
+from stats import adjust_totals
+
+DELETE_BATCH = int(os.environ.get('USER_DELETE_BATCH', 1000))
+ASYNC_ROWS = int(os.environ.get('USER_DELETE_ASYNC_ROWS', 50000))
+
+# Models holding a user's rows -> StatCounter name counting them, if any
+OWNED = {
+    UserProgress: None,
+    QuizAttempt: 'quiz_attempts',
+    CodeSubmission: 'code_submissions',
+}
+
+DELETION_REASON = 'Account deletion in progress'
+
+deletion_queue = JobQueue(workers=1, max_pending=100)
+
+
+def merge_anonymous_activity(session_id, user_id):
+    """
+    Move everything recorded for an anonymous session to an account: one
+    UPDATE per activity table, plus an upsert for progress so that sections
+    done both ways keep the better record.  The caller commits.
+    """
+    for model in (QuizAttempt, CodeSubmission):
+        model.query.filter(model.session_id == session_id, model.user_id.is_(None)).update(
+            {model.user_id: user_id, model.session_id: None}, synchronize_session=False
+        )
+    move_session_progress(session_id, user_id)
+
+
+def owned_rows(user_id):
+    """{model: number of the user's rows}"""
+    return {model: model.query.filter_by(user_id=user_id).count() for model in OWNED}
+
+
+def delete_user_now(user, counts):
+    """Delete a user and, by cascade, their rows; counts is owned_rows(); the caller commits"""
+    adjust_totals(users=-1, **{OWNED[model]: -count for model, count in counts.items() if OWNED[model]})
+    db.session.delete(user)
+
+
+def delete_user_in_batches(user_id):
+    """Delete a user's rows DELETE_BATCH at a time, then the user"""
+    for model, counter in OWNED.items():
+        while True:
+            ids = db.session.execute(
+                db.select(model.id).filter_by(user_id=user_id).limit(DELETE_BATCH)
+            ).scalars().all()
+            if not ids:
+                break
+            deleted = model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+            if counter:
+                adjust_totals(**{counter: -deleted})
+            db.session.commit()
+
+    # Another process resuming the same deletion may have got here first
+    deleted = User.query.filter_by(id=user_id).delete(synchronize_session=False)
+    adjust_totals(users=-deleted)
+    db.session.commit()
+    logging.info(f"Deleted user {user_id} in batches")
+
+
+def queue_deletion(user_id):
+    """Queue the batched deletion of a user; raises job_queue.QueueFull"""
+    def job():
+        with app.app_context():
+            delete_user_in_batches(user_id)
+            return {'success': True}
+
+    deletion_queue.submit(job, owner=user_id)
+
+
+def resume_deletions():
+    """Queue again the deletions of accounts still blocked for deletion; returns the count"""
+    user_ids = db.session.execute(
+        db.select(User.id).filter_by(is_blocked=True, blocked_reason=DELETION_REASON)
+    ).scalars().all()
+    resumed = 0
+    for user_id in user_ids:
+        try:
+            queue_deletion(user_id)
+        except QueueFull:
+            logging.warning(f"Deletion queue full; {len(user_ids) - resumed} account deletions "
+                            f"are left for the next start-up")
+            break
+        resumed += 1
+    if resumed:
+        logging.info(f"Resumed deletion of {resumed} accounts")
+    return resumed
+
+
+def remove_user(user, in_background=False):
+    """
+    Delete a user and everything they own; accounts with a long history (or
+    any account, with in_background) are blocked now and deleted by the
+    deletion queue.  Returns True if the deletion was queued.  Raises
+    job_queue.QueueFull if it could not be.
+    """
+    counts = owned_rows(user.id)
+    if not in_background and sum(counts.values()) <= ASYNC_ROWS:
+        delete_user_now(user, counts)
+        db.session.commit()
+        return False
+
+    # Blocked first so the account cannot be used while it is being deleted,
+    # and so that the deletion is resumed if the process stops before the end
+    user.block_user(DELETION_REASON)
+    db.session.commit()
+    try:
+        queue_deletion(user.id)
+    except QueueFull:
+        user.unblock_user()
+        db.session.commit()
+        raise
+    return True
@@ -0,0 +1,173 @@
+"""
+Admission control for code execution.
+
+Every run needs a ticket.  Tickets are refused (HTTP 429) when the visitor is
+over their rate or concurrency allowance, or when too many admitted runs are
+already waiting for one of the global execution slots.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+
+class Rejected(Exception):
+    """Raised when a run is not admitted; retry_after is in seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted run; holds its global slots while it executes"""
+
+    def __init__(self, controller, key, slots=1):
+        self.controller = controller
+        self.key = key
+        self.slots = slots
+        self.state = 'waiting'
+        self.started = None
+
+    def __enter__(self):
+        self.controller._start(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.controller._finish(self)
+        return False
+
+    def run(self, func):
+        """Wait for free slots, then call func()"""
+        with self:
+            return func()
+
+    def release(self):
+        """Give the ticket back without running (safe to call more than once)"""
+        self.controller._cancel(self)
+
+
+class AdmissionController:
+    """Token-bucket rate limit and concurrency caps in front of the executor"""
+
+    def __init__(self, max_in_flight, max_queue_depth, per_key_limit, rate, burst):
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.per_key_limit = per_key_limit
+        self.rate = rate
+        self.burst = burst
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._free_slots = max_in_flight
+        self._starting = deque()  # tickets waiting in _start, oldest first
+        self._waiting = 0
+        self._per_key = {}
+        self._buckets = {}  # key -> (tokens, last refill time)
+        self._average_run = 1.0  # seconds, moving average
+
+    def admit(self, key, cost=1, slots=1):
+        """Return a Ticket for key or raise Rejected
+
+        cost is the number of rate-limit tokens the run uses and slots the
+        number of global slots it runs in (a batch of snippets costs one token
+        per snippet and runs up to max_in_flight of them at a time).  A cost
+        above the burst size could never be paid and raises ValueError.
+        """
+        if cost > self.burst:
+            raise ValueError(f'A run can cost at most {self.burst} tokens')
+        slots = max(1, min(slots, self.max_in_flight))
+        with self._lock:
+            now = time.monotonic()
+
+            if self._waiting >= self.max_queue_depth:
+                self.rejected += 1
+                backlog = self._waiting / self.max_in_flight
+                raise Rejected('The code runner is busy, please try again shortly',
+                               max(1, math.ceil(backlog * self._average_run)))
+
+            if self._per_key.get(key, 0) >= self.per_key_limit:
+                self.rejected += 1
+                raise Rejected('You already have code running, please wait for it to finish',
+                               max(1, math.ceil(self._average_run)))
+
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < cost:
+                self.rejected += 1
+                raise Rejected('Too many runs, please slow down',
+                               max(1, math.ceil((cost - tokens) / self.rate)))
+
+            self._buckets[key] = (tokens - cost, now)
+            self._per_key[key] = self._per_key.get(key, 0) + 1
+            self._waiting += 1
+            self._prune_buckets(now)
+
+        return Ticket(self, key, slots)
+
+    def _prune_buckets(self, now):
+        # Buckets idle long enough to be full again carry no information
+        if len(self._buckets) < 10000:
+            return
+        refill_time = self.burst / self.rate
+        self._buckets = {key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+                         if now - updated < refill_time}
+
+    def _start(self, ticket):
+        with self._lock:
+            # Tickets start in arrival order and take all their slots at once:
+            # tickets holding part of what they need cannot block each other,
+            # and single-slot runs cannot keep overtaking a waiting batch
+            self._starting.append(ticket)
+            try:
+                while self._starting[0] is not ticket or self._free_slots < ticket.slots:
+                    self._slot_freed.wait()
+            except BaseException:
+                self._starting.remove(ticket)
+                self._slot_freed.notify_all()
+                raise
+            self._starting.popleft()
+            self._free_slots -= ticket.slots
+            # The next ticket in line may fit in what is left
+            self._slot_freed.notify_all()
+            ticket.state = 'running'
+            ticket.started = time.monotonic()
+            self._waiting -= 1
+
+    def _finish(self, ticket):
+        with self._lock:
+            if ticket.state != 'running':
+                return
+            ticket.state = 'done'
+            self._free_slots += ticket.slots
+            self._slot_freed.notify_all()
+            self._release_key(ticket.key)
+            duration = time.monotonic() - ticket.started
+            self._average_run = 0.9 * self._average_run + 0.1 * duration
+
+    def _cancel(self, ticket):
+        with self._lock:
+            if ticket.state != 'waiting':
+                return
+            ticket.state = 'done'
+            self._waiting -= 1
+            self._release_key(ticket.key)
+
+    def _release_key(self, key):
+        remaining = self._per_key.get(key, 0) - 1
+        if remaining > 0:
+            self._per_key[key] = remaining
+        else:
+            self._per_key.pop(key, None)
+
+    def stats(self):
+        """Current load, for monitoring"""
+        with self._lock:
+            return {
+                'in_flight': self.max_in_flight - self._free_slots,
+                'queue_depth': self._waiting,
+                'max_in_flight': self.max_in_flight,
+                'max_queue_depth': self.max_queue_depth,
+                'rejected': self.rejected
+            }
@@ -1,8 +1,11 @@
 import os
 import logging
+import sqlite3
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -32,6 +35,28 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 
+# SQLite tuning applied to every connection; an empty value leaves SQLite's default.
+# WAL lets readers proceed while a write is in progress, and synchronous=NORMAL
+# is durable across application crashes under WAL
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "mmap_size": os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.environ.get("SQLITE_CACHE_SIZE", "-65536"),  # negative: KiB
+    "temp_store": os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+@event.listens_for(Engine, "connect")
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Apply SQLITE_PRAGMAS, and foreign keys (needed for ON DELETE CASCADE), to SQLite connections"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+    for pragma, value in SQLITE_PRAGMAS.items():
+        if value:
+            dbapi_connection.execute(f"PRAGMA {pragma}={value}")
+
 # Initialize the app with the extension
 db.init_app(app)
 
@@ -48,6 +73,15 @@ with app.app_context():
     # Create all tables
     db.create_all()
     
+    # Upgrade tables created by older versions of the app
+    from migrations import upgrade_database
+    upgrade_database(db)
+    
+    # Run the theory code examples once so theory pages can show their output
+    if os.environ.get("PRECOMPUTE_EXAMPLES", "1") == "1":
+        from example_outputs import start_precompute
+        start_precompute(routes.execution_admission)
+    
     # Create default admin user if it doesn't exist
     from models import User
     admin = User.query.filter_by(username='admin').first()
@@ -61,6 +95,18 @@ with app.app_context():
         db.session.add(admin)
         db.session.commit()
         logging.info("Default admin user created: admin/admin123")
+    
+    # Keep the admin dashboard's statistics in step with the tables
+    from stats import start_reconciler
+    start_reconciler(app)
+    
+    # Prune, roll up and archive old quiz attempts and code submissions
+    from retention import start_retention
+    start_retention(app)
+    
+    # Finish account deletions a restart cut short
+    from accounts import resume_deletions
+    resume_deletions()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
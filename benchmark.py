@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+VisuDSA Benchmark Harness
+Times the platform's hot paths so a change can be measured before and after.
+
+Usage (from the project root):
+    python benchmark.py executor --runs 200 --concurrency 8
+    python benchmark.py progress --runs 1000 --rows 100000
+    python benchmark.py quiz --runs 500 --concurrency 16
+    python benchmark.py contention --runs 2000 --concurrency 16
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_CODE = '''numbers = [5, 3, 8, 1, 9, 2]
+numbers.sort()
+print("Sorted:", numbers)
+'''
+
+
+def timed(func, *args):
+    """Run func once and return its wall-clock time in seconds"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run_samples(func, runs, concurrency):
+    """Call func runs times across concurrency threads and collect timings"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(lambda _: timed(func), range(runs)))
+    return samples, time.perf_counter() - started
+
+
+def report(name, samples, elapsed):
+    """Print latency percentiles and throughput for one scenario"""
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    print(f"{name:<28} runs={len(samples):<5} "
+          f"mean={statistics.mean(samples) * 1000:8.2f}ms "
+          f"p50={percentile(0.50):8.2f}ms p95={percentile(0.95):8.2f}ms "
+          f"p99={percentile(0.99):8.2f}ms throughput={len(samples) / elapsed:8.1f}/s")
+
+
+def bench_executor(args):
+    """Latency of one submission through the warm pool and a cold interpreter"""
+    import code_executor
+
+    # Call below the result cache so every run really executes
+    code_executor.execute_python_code(SAMPLE_CODE)
+    samples, elapsed = run_samples(lambda: code_executor.execute_python_code(SAMPLE_CODE),
+                                   args.runs, args.concurrency)
+    report('executor: warm pool', samples, elapsed)
+
+    samples, elapsed = run_samples(lambda: code_executor.run_in_subprocess(SAMPLE_CODE),
+                                   args.runs, args.concurrency)
+    report('executor: cold subprocess', samples, elapsed)
+
+
+def query_plan(db, statement):
+    """The database's plan for statement, one line per step"""
+    from sqlalchemy import text
+
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    prefix = 'EXPLAIN QUERY PLAN' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN'
+    with db.engine.connect() as connection:
+        rows = connection.execute(text(f'{prefix} {compiled}')).fetchall()
+    return [str(row[-1]) for row in rows]
+
+
+def load_app():
+    """The Flask app and db, on a scratch SQLite database unless DATABASE_URL is set"""
+    if 'DATABASE_URL' not in os.environ:
+        scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        os.environ['DATABASE_URL'] = f'sqlite:///{scratch.name}'
+    os.environ.setdefault('PRECOMPUTE_EXAMPLES', '0')
+    from app import app, db
+    return app, db
+
+
+def bench_progress(args):
+    """Progress lookups of the theory and quiz pages on a large UserProgress table
+
+    Runs against a scratch SQLite database unless DATABASE_URL is set and
+    prints the lookups' query plans (tests/test_progress_indexes.py checks
+    that they use the progress indexes).
+    """
+    app, db = load_app()
+    from models import UserProgress
+
+    with app.app_context():
+        sections = [f'section-{i}' for i in range(50)]
+        existing = UserProgress.query.filter(UserProgress.session_id.like('bench-%')).count()
+        rows = [{'session_id': f'bench-{i // len(sections)}', 'module_name': 'theory',
+                 'section_name': sections[i % len(sections)], 'completed': True}
+                for i in range(existing, args.rows)]
+        if rows:
+            db.session.execute(db.insert(UserProgress), rows)
+            db.session.commit()
+
+        owners = max(1, args.rows // len(sections))
+        lookups = {
+            'session': lambda i: db.select(UserProgress).filter_by(
+                session_id=f'bench-{i % owners}', module_name='theory', section_name=sections[i % len(sections)]),
+            'user': lambda i: db.select(UserProgress).filter_by(
+                user_id=i % owners, module_name='theory', section_name=sections[i % len(sections)]),
+        }
+
+        for name, lookup in lookups.items():
+            print(f'progress by {name}: ' + ' | '.join(query_plan(db, lookup(0))))
+
+        counter = iter(range(sys.maxsize))
+
+        def lookup_once():
+            with app.app_context():
+                db.session.execute(lookups['session'](next(counter))).first()
+
+        samples, elapsed = run_samples(lookup_once, args.runs, args.concurrency)
+        report(f'progress: lookup ({args.rows} rows)', samples, elapsed)
+
+
+def bench_quiz(args):
+    """Latency of /submit-quiz answering every question of the longest quiz"""
+    app, _ = load_app()
+    from data.quiz_data import QUIZ_DATA
+
+    quiz_id = max(QUIZ_DATA, key=lambda quiz_id: len(QUIZ_DATA[quiz_id]['questions']))
+    body = {
+        'quiz_id': quiz_id,
+        'answers': {question['id']: question['correct_answer']
+                    for question in QUIZ_DATA[quiz_id]['questions']}
+    }
+    client = app.test_client()
+
+    def submit():
+        response = client.post('/submit-quiz', json=body)
+        assert response.get_json()['success'], response.get_json()
+
+    submit()
+    samples, elapsed = run_samples(submit, args.runs, args.concurrency)
+    report(f'quiz: submit ({len(body["answers"])} answers)', samples, elapsed)
+
+
+def bench_contention(args):
+    """Quiz submissions and progress reads at once, as around a quiz deadline
+
+    Every fourth request is a write (/submit-quiz), the rest read /progress,
+    each thread as its own anonymous visitor.  Run it once with
+    SQLITE_JOURNAL_MODE=DELETE and once with the default WAL to compare.
+    """
+    app, db = load_app()
+    from data.quiz_data import QUIZ_DATA
+
+    quiz_id = next(iter(QUIZ_DATA))
+    body = {
+        'quiz_id': quiz_id,
+        'answers': {question['id']: question['correct_answer']
+                    for question in QUIZ_DATA[quiz_id]['questions']}
+    }
+    local = threading.local()
+    samples = {'write': [], 'read': []}
+    failures = []
+
+    def request(number):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        kind = 'write' if number % 4 == 0 else 'read'
+        start = time.perf_counter()
+        if kind == 'write':
+            response = local.client.post('/submit-quiz', json=body)
+            ok = response.status_code == 200 and response.get_json()['success']
+        else:
+            response = local.client.get('/progress')
+            ok = response.status_code == 200
+        samples[kind].append(time.perf_counter() - start)
+        if not ok:
+            failures.append(kind)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(request, range(args.runs)))
+    elapsed = time.perf_counter() - started
+
+    mode = 'n/a'
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.connect() as connection:
+                mode = connection.exec_driver_sql('PRAGMA journal_mode').scalar()
+    report(f'contention: writes ({mode})', samples['write'], elapsed)
+    report(f'contention: reads ({mode})', samples['read'], elapsed)
+    print(f'failed requests: {len(failures)}')
+
+
+SCENARIOS = {
+    'executor': bench_executor,
+    'contention': bench_contention,
+    'progress': bench_progress,
+    'quiz': bench_quiz,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VisuDSA benchmark harness')
+    parser.add_argument('scenario', choices=sorted(SCENARIOS))
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--rows', type=int, default=100000, help='UserProgress rows for the progress scenario')
+    args = parser.parse_args()
+    SCENARIOS[args.scenario](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Content-addressed storage of code submission text.
+
+The code, output and error of a CodeSubmission are stored once per distinct
+text in SubmissionBlob, keyed by the SHA-256 of the text, so a template or
+theory example run thousands of times is kept once.  Blobs of
+COMPRESS_MIN_BYTES or more are zlib-compressed when that makes them smaller.
+Text of at most INLINE_MAX_BYTES stays in the submission row, where a blob
+and its hash would take more room than the text itself.  CodeSubmission's
+code, output and error properties read either form.
+"""
+
+import hashlib
+import logging
+import os
+import zlib
+
+from sqlalchemy import and_, exists, func, or_, select
+
+from app import db
+from models import CodeSubmission, SubmissionBlob
+from stats import DIALECT_INSERTS
+
+INLINE_MAX_BYTES = int(os.environ.get('SUBMISSION_INLINE_MAX_BYTES', 64))
+COMPRESS_MIN_BYTES = int(os.environ.get('SUBMISSION_COMPRESS_MIN_BYTES', 512))
+BACKFILL_BATCH = 500  # submissions moved to blobs per transaction
+
+TEXT_FIELDS = ('code', 'output', 'error')
+
+
+def encode(data):
+    """(encoding, stored bytes) for UTF-8 text"""
+    if len(data) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return 'zlib', compressed
+    return 'raw', data
+
+
+def store_text(text):
+    """
+    (inline text, blob hash) to store for one text field: long text is
+    written as a blob (if not already stored) and only its hash is kept
+    """
+    if text is None:
+        return None, None
+    data = text.encode('utf-8', errors='replace')
+    if len(data) <= INLINE_MAX_BYTES:
+        return text, None
+
+    digest = hashlib.sha256(data).hexdigest()
+    encoding, stored = encode(data)
+    values = dict(hash=digest, encoding=encoding, size=len(data), data=stored)
+    dialect_insert = DIALECT_INSERTS.get(db.engine.dialect.name)
+    if dialect_insert:
+        db.session.execute(dialect_insert(SubmissionBlob.__table__).values(**values)
+                           .on_conflict_do_nothing(index_elements=['hash']))
+    elif db.session.get(SubmissionBlob, digest) is None:
+        db.session.add(SubmissionBlob(**values))
+    return '', digest
+
+
+def text_columns(**texts):
+    """CodeSubmission column values for texts given as code=..., output=..., error=..."""
+    values = {}
+    for name, text in texts.items():
+        inline, digest = store_text(text)
+        values[f'{name}_text'] = inline
+        values[f'{name}_hash'] = digest
+    return values
+
+
+def backfill_blobs():
+    """
+    Move long inline text of existing submissions into blobs, committing
+    every BACKFILL_BATCH rows; returns the number of submissions moved
+    """
+    long_text = or_(*[
+        and_(getattr(CodeSubmission, f'{name}_hash').is_(None),
+             func.length(getattr(CodeSubmission, f'{name}_text')) > INLINE_MAX_BYTES)
+        for name in TEXT_FIELDS
+    ])
+    moved = 0
+    while True:
+        batch = CodeSubmission.query.filter(long_text).order_by(CodeSubmission.id).limit(BACKFILL_BATCH).all()
+        if not batch:
+            break
+        for submission in batch:
+            for name in TEXT_FIELDS:
+                if getattr(submission, f'{name}_hash') is not None:
+                    continue
+                inline, digest = store_text(getattr(submission, f'{name}_text'))
+                if digest is not None:
+                    setattr(submission, f'{name}_text', inline)
+                    setattr(submission, f'{name}_hash', digest)
+        db.session.commit()
+        moved += len(batch)
+    if moved:
+        logging.info(f"Moved the text of {moved} code submissions into blobs")
+    return moved
+
+
+def delete_unreferenced_blobs():
+    """
+    Delete blobs no submission refers to any more (left behind when
+    submissions are deleted), BACKFILL_BATCH at a time; returns the count
+    """
+    unreferenced = and_(*[
+        ~exists().where(getattr(CodeSubmission, f'{name}_hash') == SubmissionBlob.hash)
+        for name in TEXT_FIELDS
+    ])
+    deleted = 0
+    while True:
+        hashes = db.session.execute(
+            select(SubmissionBlob.hash).where(unreferenced).limit(BACKFILL_BATCH)
+        ).scalars().all()
+        if not hashes:
+            break
+        result = db.session.execute(
+            SubmissionBlob.__table__.delete().where(SubmissionBlob.hash.in_(hashes), unreferenced)
+        )
+        db.session.commit()
+        deleted += result.rowcount
+    if deleted:
+        logging.info(f"Deleted {deleted} unreferenced submission blobs")
+    return deleted
@@ -4,16 +4,363 @@ import os
 import time
 import logging
 import shutil
+import json
+import queue
+import select
+import threading
+import atexit
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from code_policy import check_code
 PYTHON_CMD = shutil.which("python3") or shutil.which("python") or "python"
 
-def execute_code(code, language='python'):
+EXECUTION_TIMEOUT = 5  # seconds of wall-clock time per submission
+
+# Per-submission resource limits (enforced by the sandbox worker)
+CPU_TIME_LIMIT = int(os.environ.get('CODE_EXECUTOR_CPU_LIMIT', 4))  # seconds
+MEMORY_LIMIT_MB = int(os.environ.get('CODE_EXECUTOR_MEMORY_LIMIT_MB', 256))  # address space
+MAX_OUTPUT_BYTES = int(os.environ.get('CODE_EXECUTOR_MAX_OUTPUT_BYTES', 1024 * 1024))
+MAX_PROCESSES = int(os.environ.get('CODE_EXECUTOR_MAX_PROCESSES', 0))  # RLIMIT_NPROC, counted per OS user
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_worker.py')
+
+# Warm interpreter pool (POSIX only, falls back to one subprocess per run)
+POOL_SIZE = int(os.environ.get('CODE_EXECUTOR_POOL_SIZE', 4))
+POOL_MAX_RUNS = int(os.environ.get('CODE_EXECUTOR_MAX_RUNS', 100))
+POOL_ACQUIRE_TIMEOUT = 10  # seconds to wait for a free worker
+WORKER_GRACE = 2  # extra seconds a worker gets to report after the child timeout
+
+# Every sandbox interpreter uses the same hash seed, so set and dict order of
+# strings, and hash() itself, print the same whichever worker runs the code
+SANDBOX_HASH_SEED = '0'
+
+# Result cache for repeated identical submissions
+CACHE_MAX_ENTRIES = int(os.environ.get('CODE_EXECUTOR_CACHE_SIZE', 1024))
+CACHE_MAX_BYTES = int(os.environ.get('CODE_EXECUTOR_CACHE_BYTES', 16 * 1024 * 1024))
+CACHE_TTL = int(os.environ.get('CODE_EXECUTOR_CACHE_TTL', 3600))
+
+# Streaming runs stop forwarding (and kill the program) past this much output
+STREAM_MAX_BYTES = int(os.environ.get('CODE_EXECUTOR_STREAM_MAX_BYTES', MAX_OUTPUT_BYTES))
+
+# Batch runs share one overall deadline
+BATCH_DEADLINE = int(os.environ.get('CODE_EXECUTOR_BATCH_DEADLINE', 10))  # seconds
+BATCH_MAX_SNIPPETS = int(os.environ.get('CODE_EXECUTOR_BATCH_MAX_SNIPPETS', 20))
+
+# Rows of the function and allocation tables returned by profiled runs
+PROFILE_TOP = int(os.environ.get('CODE_EXECUTOR_PROFILE_TOP', 15))
+
+# Caps on execution traces for the visualizer
+TRACE_MAX_FRAMES = int(os.environ.get('CODE_EXECUTOR_TRACE_MAX_FRAMES', 1000))
+TRACE_MAX_BYTES = int(os.environ.get('CODE_EXECUTOR_TRACE_MAX_BYTES', 2 * 1024 * 1024))
+TRACE_MAX_ITEMS = 50  # elements shown per container, variables per frame
+TRACE_MAX_OBJECTS = 200  # heap objects captured per frame
+
+
+# Server environment variables sandboxed code may see; anything else
+# (SESSION_SECRET, DATABASE_URL, API keys) stays out.  Windows cannot start
+# Python without SYSTEMROOT.
+SANDBOX_ENV_PASSTHROUGH = ('PATH', 'LANG', 'SYSTEMROOT')
+
+
+def sandbox_command(*args):
+    """
+    Interpreter command and environment for sandboxed code: -s -P and an
+    environment without PYTHON* variables are what -I would give, except
+    that -I would also ignore PYTHONHASHSEED
+    """
+    env = {name: os.environ[name] for name in SANDBOX_ENV_PASSTHROUGH if name in os.environ}
+    env['PYTHONHASHSEED'] = SANDBOX_HASH_SEED
+    return [PYTHON_CMD, '-s', '-P', *args], env
+
+
+class WorkerUnavailable(Exception):
+    """Raised when no sandbox worker can take a submission"""
+
+
+class SandboxWorker:
+    """A pre-started interpreter that runs each submission in a forked child"""
+
+    def __init__(self):
+        command, env = sandbox_command(WORKER_SCRIPT)
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=tempfile.gettempdir(),
+            env=env
+        )
+        self.runs = 0
+        self.broken = False
+        self._buffer = b''
+
+    def is_alive(self):
+        return not self.broken and self.process.poll() is None
+
+    def _send(self, request):
+        self.runs += 1
+        try:
+            self.process.stdin.write((json.dumps(request) + '\n').encode('utf-8'))
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            self.broken = True
+            raise WorkerUnavailable(f'Sandbox worker failed: {e}')
+
+    def _receive(self, deadline):
+        """Read the next protocol message, giving up at deadline"""
+        fd = self.process.stdout.fileno()
+        while b'\n' not in self._buffer:
+            remaining = deadline - time.monotonic()
+            try:
+                ready, _, _ = select.select([fd], [], [], max(remaining, 0))
+                data = os.read(fd, 65536) if ready else b''
+            except OSError as e:
+                self.broken = True
+                raise WorkerUnavailable(f'Sandbox worker failed: {e}')
+            if not data:
+                self.broken = True
+                raise WorkerUnavailable('Sandbox worker stopped responding')
+            self._buffer += data
+
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        try:
+            return json.loads(line)
+        except ValueError:
+            self.broken = True
+            raise WorkerUnavailable('Sandbox worker sent a malformed report')
+
+    def run(self, code, timeout, **options):
+        """Send one submission to the worker and wait for its report"""
+        self._send({'code': code, 'timeout': timeout, **options})
+        return self._receive(time.monotonic() + timeout + WORKER_GRACE)
+
+    def stream(self, code, timeout, **options):
+        """Yield output chunk messages as they arrive, then the final report"""
+        self._send({'code': code, 'timeout': timeout, 'stream': True, **options})
+        deadline = time.monotonic() + timeout + WORKER_GRACE
+        finished = False
+        try:
+            while not finished:
+                message = self._receive(deadline)
+                finished = message['event'] == 'result'
+                yield message
+        finally:
+            # A reader that stops early leaves unread messages behind
+            if not finished:
+                self.broken = True
+
+    def close(self):
+        # A broken worker may still be running a submission; SIGTERM makes it
+        # kill that child before exiting
+        if self.broken and self.process.poll() is None:
+            self.process.terminate()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class WorkerPool:
+    """Fixed-size pool of warm sandbox workers recycled after N runs or on crash"""
+
+    def __init__(self, size, max_runs):
+        self.size = size
+        self.max_runs = max_runs
+        self.pid = os.getpid()
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._spawn()
+
+    def _spawn(self):
+        worker = SandboxWorker()
+        with self._lock:
+            self._workers.add(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.close()
+
+    def _acquire(self):
+        try:
+            return self._idle.get(timeout=POOL_ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise WorkerUnavailable('All sandbox workers are busy')
+
+    def _release(self, worker):
+        if worker.is_alive() and worker.runs < self.max_runs:
+            self._idle.put(worker)
+        else:
+            self._retire(worker)
+            self._spawn()
+
+    def run(self, code, timeout, **options):
+        """Run code on an idle worker, replacing the worker when it is spent"""
+        worker = self._acquire()
+        try:
+            return worker.run(code, timeout, **options)
+        finally:
+            self._release(worker)
+
+    def stream(self, code, timeout, **options):
+        """Like run(), but yield output chunks before the final report"""
+        worker = self._acquire()
+        try:
+            yield from worker.stream(code, timeout, **options)
+        finally:
+            self._release(worker)
+
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """Return this process's worker pool, or None when pooling is unavailable"""
+    global _pool
+    if POOL_SIZE <= 0 or not hasattr(os, 'fork'):
+        return None
+    with _pool_lock:
+        # A pool inherited across a fork (e.g. gunicorn preload) is not ours
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = WorkerPool(POOL_SIZE, POOL_MAX_RUNS)
+        return _pool
+
+
+@atexit.register
+def shutdown_worker_pool():
+    if _pool is not None and _pool.pid == os.getpid():
+        _pool.shutdown()
+
+
+class ResultCache:
+    """Thread-safe LRU cache of execution results with a TTL and a size cap"""
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, result)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                self._evict(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[2])
+
+    def put(self, key, result):
+        size = len(result.get('output', '')) + len(result.get('error', ''))
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.time() + self.ttl, size, dict(result))
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+result_cache = ResultCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL)
+_interpreter_version = None
+
+
+def get_interpreter_version():
+    """Version string of the sandbox interpreter, looked up once"""
+    global _interpreter_version
+    if _interpreter_version is None:
+        result = subprocess.run(
+            [PYTHON_CMD, '-I', '-c', 'import sys; print(sys.version)'],
+            capture_output=True,
+            text=True,
+            timeout=EXECUTION_TIMEOUT
+        )
+        _interpreter_version = result.stdout.strip()
+    return _interpreter_version
+
+
+def cache_key(code, language):
+    """Content hash of a submission for the interpreter that would run it"""
+    digest = hashlib.sha256()
+    for part in (language, get_interpreter_version(), code):
+        digest.update(part.encode('utf-8', errors='surrogatepass'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def cacheable(code, result):
+    """Whether result may be served again for the same code"""
+    # Default reprs ("<Node object at 0x...>") show addresses, which differ
+    # between workers
+    return result['success'] and check_code(code).deterministic and ' at 0x' not in result.get('output', '')
+
+
+def execute_code(code, language='python', profile=False):
     """
     Execute code in a subprocess with security restrictions
-    Returns dict with success, output, error, and execution_time
+    Returns dict with success, output, error, execution_time, cache_hit and,
+    when the worker pool ran it, peak_rss_kb, cpu_user_time, cpu_system_time
+    and kill_reason.  With profile=True the code runs under cProfile and
+    tracemalloc and the report is added as profile (never cached).  Results
+    of code that could not be run at all (no free worker, batch deadline)
+    carry unavailable: True
     """
     try:
-        if language == 'python':
-            return execute_python_code(code)
+        if language == 'python' and profile:
+            result, report = run_harness(code, {'kind': 'profile', 'top': PROFILE_TOP}, EXECUTION_TIMEOUT)
+            result['profile'] = report
+            result['cache_hit'] = False
+            return result
+        elif language == 'python':
+            key = cache_key(code, language)
+            result = result_cache.get(key)
+            if result is not None:
+                result['cache_hit'] = True
+                return result
+
+            result = execute_python_code(code)
+            if cacheable(code, result):
+                result_cache.put(key, result)
+            result['cache_hit'] = False
+            return result
         else:
             return {
                 'success': False,
@@ -26,43 +373,243 @@ def execute_code(code, language='python'):
             'error': f'Execution error: {str(e)}'
         }
 
+def execute_batch(snippets, deadline=BATCH_DEADLINE, concurrency=POOL_SIZE):
+    """
+    Execute several (code, language) snippets, at most concurrency at a time
+    Returns one execute_code result per snippet, in order; snippets not yet
+    started when the overall deadline passes get an error result.  Snippets
+    already running are waited for (each within its own timeout), so the
+    caller's admission slots are held until every worker it used is free.
+    """
+    if not snippets:
+        return []
+
+    workers = max(1, min(len(snippets), concurrency, POOL_SIZE))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(execute_code, code, language) for code, language in snippets]
+        wait(futures, timeout=deadline)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    results = []
+    for future in futures:
+        if not future.cancelled():
+            results.append(future.result())
+        else:
+            results.append({
+                'success': False,
+                'error': f'Batch deadline exceeded ({deadline} seconds)',
+                'kill_reason': 'timeout',
+                'unavailable': True
+            })
+    return results
+
+def check_code_policy(code):
+    """Return an error result if code is rejected by the static policy, else None"""
+    verdict = check_code(code)
+    if verdict.allowed:
+        return None
+    return {
+        'success': False,
+        'error': verdict.error
+    }
+
+def sandbox_limits():
+    """rlimits applied to every submission's process"""
+    return {
+        'cpu_seconds': CPU_TIME_LIMIT,
+        'memory_bytes': MEMORY_LIMIT_MB * 1024 * 1024,
+        'processes': MAX_PROCESSES
+    }
+
+def result_from_report(report, timeout=EXECUTION_TIMEOUT):
+    """Convert a sandbox worker report into the execute_code result dict"""
+    usage = {
+        'execution_time': report['elapsed'],
+        'peak_rss_kb': report['peak_rss_kb'],
+        'cpu_user_time': report['cpu_user_time'],
+        'cpu_system_time': report['cpu_system_time'],
+        'kill_reason': report['kill_reason']
+    }
+    kill_reason = report['kill_reason']
+
+    if kill_reason == 'timeout':
+        return {
+            'success': False,
+            'error': f'Code execution timed out ({timeout} seconds limit)',
+            **usage
+        }
+    if kill_reason == 'output_limit':
+        return {
+            'success': False,
+            'output': report['stdout'],
+            'error': report['stderr'] + 'Output limit exceeded, program stopped',
+            **usage
+        }
+    if kill_reason == 'cpu_limit':
+        return {
+            'success': False,
+            'error': report['stderr'] + f'CPU time limit exceeded ({CPU_TIME_LIMIT} seconds)',
+            **usage
+        }
+    if kill_reason == 'memory_limit':
+        return {
+            'success': False,
+            'error': report['stderr'] + f'Memory limit exceeded ({MEMORY_LIMIT_MB} MB)',
+            **usage
+        }
+    if report['returncode'] == 0:
+        return {
+            'success': True,
+            'output': report['stdout'],
+            **usage
+        }
+    return {
+        'success': False,
+        'error': report['stderr'],
+        **usage
+    }
+
 def execute_python_code(code):
     """Execute Python code safely"""
-    # Security check for dangerous imports/operations
-    dangerous_keywords = [
-        'import os', 'import sys', 'import subprocess', 'import socket',
-        'import urllib', 'import requests', 'import shutil', 'import tempfile',
-        'open(', 'file(', 'exec(', 'eval(', '__import__'
-    ]
-    
-    for keyword in dangerous_keywords:
-        if keyword in code.lower():
-            return {
+    rejection = check_code_policy(code)
+    if rejection:
+        return rejection
+
+    pool = get_worker_pool()
+    if pool is None:
+        return run_in_subprocess(code)
+
+    try:
+        report = pool.run(code, EXECUTION_TIMEOUT,
+                          max_output=MAX_OUTPUT_BYTES, limits=sandbox_limits())
+    except WorkerUnavailable as e:
+        logging.error(f"Sandbox pool error: {str(e)}")
+        return {
+            'success': False,
+            'error': 'Code execution service is busy, please try again',
+            'unavailable': True
+        }
+    return result_from_report(report)
+
+def run_harness(code, harness, timeout):
+    """
+    Load code in the sandbox and hand it to a worker harness (see
+    sandbox_worker.HARNESSES)
+    Returns (result, harness report); the report is None when the code was
+    rejected, failed to load or the harness could not run
+    """
+    rejection = check_code_policy(code)
+    if rejection:
+        return rejection, None
+
+    pool = get_worker_pool()
+    if pool is None:
+        return {
+            'success': False,
+            'error': 'This feature needs the sandbox worker pool, which is unavailable on this platform'
+        }, None
+
+    try:
+        report = pool.run(code, timeout, max_output=MAX_OUTPUT_BYTES,
+                          limits=sandbox_limits(), harness=harness)
+    except WorkerUnavailable as e:
+        logging.error(f"Sandbox pool error: {str(e)}")
+        return {
+            'success': False,
+            'error': 'Code execution service is busy, please try again',
+            'unavailable': True
+        }, None
+    return result_from_report(report, timeout), report.get('harness_result')
+
+def trace_code(code):
+    """
+    Execute code recording its variables line by line for the visualizer
+    Returns the execute_code style result plus trace: delta-encoded frames
+    (see sandbox_worker.Tracer), frame_count and truncated, or None
+    """
+    harness = {
+        'kind': 'trace',
+        'max_frames': TRACE_MAX_FRAMES,
+        'max_bytes': TRACE_MAX_BYTES,
+        'max_items': TRACE_MAX_ITEMS,
+        'max_objects': TRACE_MAX_OBJECTS
+    }
+    result, report = run_harness(code, harness, EXECUTION_TIMEOUT)
+    result['trace'] = report
+    return result
+
+def stream_code(code, language='python', max_output=STREAM_MAX_BYTES):
+    """
+    Execute code, yielding output as it is produced
+    Yields {'event': 'chunk', 'stream', 'data'} messages, then one
+    {'event': 'result', 'result'} message holding the execute_code dict
+    """
+    if language != 'python':
+        yield {'event': 'result', 'result': {'success': False, 'error': 'Only Python is supported.'}}
+        return
+
+    key = cache_key(code, language)
+    result = result_cache.get(key)
+    if result is not None:
+        result['cache_hit'] = True
+        if result.get('output'):
+            yield {'event': 'chunk', 'stream': 'stdout', 'data': result['output']}
+        yield {'event': 'result', 'result': result}
+        return
+
+    result = check_code_policy(code)
+    pool = get_worker_pool()
+    if result is None and pool is None:
+        result = run_in_subprocess(code)
+        if result.get('output'):
+            yield {'event': 'chunk', 'stream': 'stdout', 'data': result['output']}
+    elif result is None:
+        try:
+            for message in pool.stream(code, EXECUTION_TIMEOUT,
+                                       max_output=max_output, limits=sandbox_limits()):
+                if message['event'] == 'chunk':
+                    yield message
+                else:
+                    result = result_from_report(message)
+        except WorkerUnavailable as e:
+            logging.error(f"Sandbox pool error: {str(e)}")
+            result = {
                 'success': False,
-                'error': f'Security restriction: {keyword} is not allowed'
+                'error': 'Code execution service is busy, please try again'
             }
-    
+
+    if cacheable(code, result):
+        result_cache.put(key, result)
+    result['cache_hit'] = False
+    yield {'event': 'result', 'result': result}
+
+def run_in_subprocess(code):
+    """Execute Python code in a fresh interpreter (used when no pool is available)
+
+    The source is fed through stdin, so nothing touches the disk and there is
+    no file left to clean up when the run times out or the server crashes.
+    Only the wall-clock timeout is enforced here; resource limits and usage
+    accounting need the worker pool.
+    """
     try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
-        
-        start_time = time.time()
-        
+        start_time = time.perf_counter()
+
         # Execute with timeout and restricted environment
+        command, env = sandbox_command('-')
         result = subprocess.run(
-            ['python3', temp_file],
+            command,
+            input=code,
             capture_output=True,
             text=True,
-            timeout=5,  # 5 second timeout
-            cwd=tempfile.gettempdir()
+            timeout=EXECUTION_TIMEOUT,
+            cwd=tempfile.gettempdir(),
+            env=env
         )
-        
-        execution_time = time.time() - start_time
-        
-        # Clean up
-        os.unlink(temp_file)
-        
+
+        execution_time = time.perf_counter() - start_time
+
         if result.returncode == 0:
             return {
                 'success': True,
@@ -75,15 +622,15 @@ def execute_python_code(code):
                 'error': result.stderr,
                 'execution_time': execution_time
             }
-            
+
     except subprocess.TimeoutExpired:
         return {
             'success': False,
-            'error': 'Code execution timed out (5 seconds limit)'
+            'error': f'Code execution timed out ({EXECUTION_TIMEOUT} seconds limit)',
+            'kill_reason': 'timeout'
         }
     except Exception as e:
         return {
             'success': False,
             'error': str(e)
         }
-
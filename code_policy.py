@@ -0,0 +1,241 @@
+"""
+Static policy checks for submitted Python code.
+
+Submissions are parsed once and walked with an AST visitor that looks at
+imports, attribute access and references to dangerous builtins, so comments,
+strings and identifiers such as ``reopen`` no longer trip the check while
+``from os import system`` no longer slips through.  Only modules in
+ALLOWED_MODULES may be imported.  Verdicts are cached by a hash of the source.
+"""
+
+import ast
+import hashlib
+import threading
+import traceback
+from collections import OrderedDict
+
+SOURCE_NAME = 'main.py'  # matches the file name the sandbox reports in tracebacks
+
+# Top-level modules submissions may import; everything else (os, io, codecs,
+# linecache, gzip, zipfile, ...) may reach the file system, processes,
+# network or interpreter internals
+ALLOWED_MODULES = {
+    'abc', 'array', 'base64', 'binascii', 'bisect', 'cmath', 'collections', 'copy',
+    'dataclasses', 'datetime', 'decimal', 'enum', 'fractions', 'functools', 'graphlib',
+    'hashlib', 'heapq', 'itertools', 'json', 'keyword', 'math', 'numbers', 'operator',
+    'queue', 'random', 're', 'secrets', 'statistics', 'string', 'struct', 'textwrap',
+    'threading', 'time', 'typing', 'zlib'
+}
+
+# Builtins that open files, evaluate strings or import dynamically
+FORBIDDEN_BUILTINS = {
+    'open', 'exec', 'eval', 'compile', '__import__', 'breakpoint',
+    'globals', 'vars', '__builtins__'
+}
+
+# Attributes (and names imported with "from ... import") used to climb from an
+# ordinary object back to the interpreter, to a module that is not allowed or
+# to code that evaluates strings.  The module names are those the allowed
+# modules keep as attributes, e.g. typing.sys and json.codecs; ForwardRef,
+# get_type_hints and singledispatch evaluate string annotations.  Private
+# attributes (a leading underscore, not a dunder) are refused as well, see
+# is_forbidden_attribute().
+FORBIDDEN_ATTRIBUTES = {
+    '__subclasses__', '__globals__', '__builtins__', '__code__', '__closure__',
+    '__bases__', '__base__', '__mro__', '__import__', '__loader__', '__spec__',
+    '__self__', '__dict__', '__getattribute__', '__annotations__', 'open', 'Formatter',
+    'ForwardRef', 'get_type_hints', 'singledispatch', 'singledispatchmethod',
+    'f_globals', 'f_locals', 'f_back', 'f_builtins', 'gi_frame', 'cr_frame', 'ag_frame', 'tb_frame',
+    'os', 'sys', 'builtins', 'bltns', 'codecs', 'contextlib', 'copyreg',
+    'inspect', 'types', 'warnings'
+}
+
+# Modules whose output is expected to change between runs
+NONDETERMINISTIC_MODULES = {'random', 'time', 'datetime', 'uuid', 'secrets', 'threading'}
+
+# Builtins whose values differ between sandbox processes (object addresses)
+NONDETERMINISTIC_BUILTINS = {'id'}
+
+# Callables that look attributes up by name -> position of the first name
+# argument.  They may only be called directly, with constant names.
+DYNAMIC_ATTRIBUTE_CALLS = {
+    'getattr': 1, 'setattr': 1, 'delattr': 1, 'hasattr': 1,
+    'attrgetter': 0, 'methodcaller': 0
+}
+
+VERDICT_CACHE_SIZE = 4096
+
+
+def is_forbidden_attribute(name):
+    """Whether submissions may not access attribute name
+
+    Allowed modules keep helpers that build and run code from strings under
+    private names (dataclasses._create_fn, ForwardRef._evaluate), and
+    modules they use as _os, _sys, ...; dunders are left to
+    FORBIDDEN_ATTRIBUTES.
+    """
+    if name in FORBIDDEN_ATTRIBUTES:
+        return True
+    return name.startswith('_') and not (name.startswith('__') and name.endswith('__'))
+
+
+class Verdict:
+    """Outcome of checking one submission"""
+
+    def __init__(self, allowed, error=None, deterministic=False):
+        self.allowed = allowed
+        self.error = error
+        self.deterministic = deterministic
+
+
+class PolicyViolation(Exception):
+    pass
+
+
+class PolicyVisitor:
+    """Checks every node of a tree in one iterative pass
+
+    Raises PolicyViolation on the first problem and records the top-level
+    modules imported and whether nondeterministic builtins are used.
+    """
+
+    def __init__(self):
+        self.modules = set()
+        self.nondeterministic = False
+        self._direct_calls = set()  # ids of nodes called as func of a checked Call
+        self._dispatch = {
+            ast.Import: self.visit_Import,
+            ast.ImportFrom: self.visit_ImportFrom,
+            ast.Name: self.visit_Name,
+            ast.Attribute: self.visit_Attribute,
+            ast.Call: self.visit_Call
+        }
+
+    def check(self, tree):
+        # ast.walk is iterative, so deeply nested code cannot exhaust the stack.
+        # It visits a Call before its func, which visit_Name and
+        # visit_Attribute rely on.
+        dispatch = self._dispatch
+        for node in ast.walk(tree):
+            handler = dispatch.get(type(node))
+            if handler is not None:
+                handler(node)
+
+    def violation(self, node, what):
+        raise PolicyViolation(f'Security restriction: {what} is not allowed (line {node.lineno})')
+
+    def check_module(self, node, name):
+        top_level = name.split('.')[0]
+        self.modules.add(top_level)
+        if top_level not in ALLOWED_MODULES:
+            self.violation(node, f'import {top_level}')
+
+    def check_dynamic(self, node, name):
+        # A lookup function used other than as the callee of a checked call
+        # (passed around, renamed) could look up anything
+        if name in DYNAMIC_ATTRIBUTE_CALLS and id(node) not in self._direct_calls:
+            self.violation(node, f'{name} other than in a direct call')
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.check_module(node, alias.name)
+
+    def visit_ImportFrom(self, node):
+        if node.level == 0 and node.module:
+            self.check_module(node, node.module)
+        for alias in node.names:
+            if alias.name == '*':
+                self.violation(node, f'from {node.module} import *')
+            if alias.name in FORBIDDEN_BUILTINS or is_forbidden_attribute(alias.name):
+                self.violation(node, alias.name)
+            if alias.name in DYNAMIC_ATTRIBUTE_CALLS and alias.asname not in (None, alias.name):
+                self.violation(node, f'renaming {alias.name}')
+
+    def visit_Name(self, node):
+        if node.id in FORBIDDEN_BUILTINS:
+            self.violation(node, node.id)
+        if node.id in NONDETERMINISTIC_BUILTINS:
+            self.nondeterministic = True
+        self.check_dynamic(node, node.id)
+
+    def visit_Attribute(self, node):
+        if is_forbidden_attribute(node.attr):
+            self.violation(node, f'access to {node.attr}')
+        self.check_dynamic(node, node.attr)
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Name):
+            name = func.id
+        elif isinstance(func, ast.Attribute):
+            name = func.attr
+        else:
+            return
+        if name not in DYNAMIC_ATTRIBUTE_CALLS:
+            return
+        self._direct_calls.add(id(func))
+        first = DYNAMIC_ATTRIBUTE_CALLS[name]
+        # attrgetter takes any number of (dotted) names, the others one
+        names = node.args[first:] if name == 'attrgetter' else node.args[first:first + 1]
+        if not names or not all(isinstance(arg, ast.Constant) and isinstance(arg.value, str) for arg in names):
+            self.violation(node, f'{name}() with a computed attribute name')
+        for arg in names:
+            for attribute in arg.value.split('.'):
+                if is_forbidden_attribute(attribute):
+                    self.violation(node, f'access to {attribute}')
+
+
+def source_line(error, code):
+    """Point a SyntaxError at the submitted line
+
+    CPython fills SyntaxError.text by re-reading the file name from disk, which
+    for "main.py" would quote whatever file of that name is in the working
+    directory.
+    """
+    lines = code.splitlines()
+    if error.lineno and 0 < error.lineno <= len(lines):
+        error.text = lines[error.lineno - 1] + '\n'
+
+
+def analyze(code):
+    """Parse and check code without consulting the cache"""
+    try:
+        tree = compile(code, SOURCE_NAME, 'exec', ast.PyCF_ONLY_AST)
+    except SyntaxError as e:
+        # Report it exactly as the sandbox would, without starting one
+        source_line(e, code)
+        return Verdict(False, ''.join(traceback.format_exception_only(type(e), e)))
+    except ValueError as e:
+        return Verdict(False, f'SyntaxError: {e}')
+    except (RecursionError, MemoryError):
+        return Verdict(False, 'Code is nested too deeply to be checked')
+
+    visitor = PolicyVisitor()
+    try:
+        visitor.check(tree)
+    except PolicyViolation as e:
+        return Verdict(False, str(e))
+
+    deterministic = not (visitor.modules & NONDETERMINISTIC_MODULES or visitor.nondeterministic)
+    return Verdict(True, deterministic=deterministic)
+
+
+_verdicts = OrderedDict()
+_verdicts_lock = threading.Lock()
+
+
+def check_code(code):
+    """Return the (cached) Verdict for code"""
+    key = hashlib.sha256(code.encode('utf-8', errors='surrogatepass')).hexdigest()
+    with _verdicts_lock:
+        verdict = _verdicts.get(key)
+        if verdict is not None:
+            _verdicts.move_to_end(key)
+            return verdict
+
+    verdict = analyze(code)
+    with _verdicts_lock:
+        _verdicts[key] = verdict
+        if len(_verdicts) > VERDICT_CACHE_SIZE:
+            _verdicts.popitem(last=False)
+    return verdict
@@ -0,0 +1,156 @@
+"""
+Empirical complexity measurement of user functions.
+
+The sandbox times a function at a range of input sizes (see
+sandbox_worker.measure_complexity) and the resulting series is fitted here
+against the usual growth curves, so students can check the complexities the
+theory pages quote against their own code.
+"""
+
+import math
+import os
+
+from code_executor import EXECUTION_TIMEOUT, run_harness
+
+COMPLEXITY_BUDGET = float(os.environ.get('CODE_EXECUTOR_COMPLEXITY_BUDGET', 10))  # seconds for all sizes
+COMPLEXITY_PARALLEL = int(os.environ.get('CODE_EXECUTOR_COMPLEXITY_PARALLEL', 4))
+COMPLEXITY_MAX_SIZE = int(os.environ.get('CODE_EXECUTOR_COMPLEXITY_MAX_SIZE', 1000000))
+MAX_SIZES = 16
+DEFAULT_SIZES = [100 * 2 ** i for i in range(9)]  # 100 .. 25,600
+INPUT_KINDS = ('list', 'sorted_list', 'int', 'string')
+MIN_POINTS = 3  # sizes needed before a curve is fitted
+
+# Candidate growth curves, simplest first
+MODELS = [
+    ('O(1)', lambda n: 0.0),
+    ('O(log n)', lambda n: math.log(n)),
+    ('O(n)', lambda n: float(n)),
+    ('O(n log n)', lambda n: n * math.log(n)),
+    ('O(n^2)', lambda n: float(n) * n),
+]
+
+# A simpler curve is preferred unless a more complex one fits clearly better
+FIT_TOLERANCE = 0.1  # relative
+FIT_SLACK = 0.02  # absolute, in relative-error units
+
+# Series that grow less than this over the whole size range are constant.
+# Fresh copies of large inputs leave the cache cold, which slows even O(1)
+# calls by up to ~1.5x at the largest sizes; O(log n) grows over 2x between
+# the default smallest and largest size
+FLAT_RATIO = 1.6
+MEMORY_FLOOR = 1024  # bytes; series peaking below this are interpreter noise
+
+
+def fit_model(sizes, values, curve):
+    """Weighted least-squares fit of value = intercept + coefficient * curve(n)
+
+    Points are weighted by 1/value^2 so every size counts by its relative
+    error, however small its value.  Returns (intercept, coefficient, error)
+    where error is the root mean square relative error of the fit.
+    """
+    floor = max(max(values) * 1e-6, 1e-12)
+    weights = [1 / max(value, floor) ** 2 for value in values]
+    xs = [curve(n) for n in sizes]
+
+    total_weight = sum(weights)
+    mean_x = sum(w * x for w, x in zip(weights, xs)) / total_weight
+    mean_y = sum(w * y for w, y in zip(weights, values)) / total_weight
+    spread = sum(w * (x - mean_x) ** 2 for w, x in zip(weights, xs))
+    coefficient = 0.0
+    if spread > 0:
+        coefficient = sum(w * (x - mean_x) * (y - mean_y)
+                          for w, x, y in zip(weights, xs, values)) / spread
+    if coefficient < 0:
+        # Shrinking with n is no evidence for this curve; treat it as constant
+        coefficient = 0.0
+    intercept = mean_y - coefficient * mean_x
+
+    error = math.sqrt(sum(((y - intercept - coefficient * x) / max(y, floor)) ** 2
+                          for x, y in zip(xs, values)) / len(values))
+    return intercept, coefficient, error
+
+
+def fit_complexity(sizes, values, floor=0):
+    """Fit every model and pick the simplest one that fits about as well as the best
+
+    A series that never exceeds floor is reported as constant.
+    """
+    fits = []
+    for name, curve in MODELS:
+        intercept, coefficient, error = fit_model(sizes, values, curve)
+        fits.append({'model': name, 'intercept': intercept, 'coefficient': coefficient, 'error': error})
+
+    if max(values) <= floor or max(values) < FLAT_RATIO * min(values):
+        return {'best': 'O(1)', 'models': fits}
+    best_error = min(fit['error'] for fit in fits)
+    threshold = best_error + max(FIT_SLACK, best_error * FIT_TOLERANCE)
+    best = next(fit['model'] for fit in fits if fit['error'] <= threshold)
+    return {'best': best, 'models': fits}
+
+
+def parse_sizes(sizes):
+    """Validate requested sizes; returns (sizes, error message)"""
+    if sizes is None:
+        return DEFAULT_SIZES, None
+    if (not isinstance(sizes, list) or not sizes or len(sizes) > MAX_SIZES
+            or not all(isinstance(n, int) and not isinstance(n, bool) for n in sizes)):
+        return None, f'sizes must be a list of up to {MAX_SIZES} integers'
+    if not all(1 <= n <= COMPLEXITY_MAX_SIZE for n in sizes):
+        return None, f'Sizes must be between 1 and {COMPLEXITY_MAX_SIZE}'
+    return sorted(set(sizes)), None
+
+
+def measure_complexity(code, function, input_kind='list', setup=None, sizes=None,
+                       parallel=COMPLEXITY_PARALLEL):
+    """
+    Time a function defined by code at a range of input sizes, parallel
+    sizes at a time
+    input_kind picks generated input (list, sorted_list, int or string);
+    setup names a function of the submission returning the argument(s) for
+    size n instead.  Returns the execute_code style result plus series (per
+    size: n, time, mean_time, repeats, memory_peak_bytes), failed sizes,
+    and time_fit/memory_fit with the best matching curve
+    """
+    sizes, error = parse_sizes(sizes)
+    if error is None and setup is None and input_kind not in INPUT_KINDS:
+        error = f'input must be one of {", ".join(INPUT_KINDS)}'
+    if error:
+        return {'success': False, 'error': error}
+
+    harness = {
+        'kind': 'complexity',
+        'function': function,
+        'input': input_kind,
+        'setup': setup,
+        'sizes': sizes,
+        'budget': COMPLEXITY_BUDGET,
+        'parallel': parallel
+    }
+    result, report = run_harness(code, harness, EXECUTION_TIMEOUT + COMPLEXITY_BUDGET)
+    result.update(series=[], failed=[], time_fit=None, memory_fit=None)
+
+    if report is None:
+        result['success'] = False
+        return result
+    if 'error' in report:
+        result['success'] = False
+        result['error'] = result.get('error', '') + report['error']
+        return result
+
+    result['series'] = [point for point in report['sizes'] if 'error' not in point]
+    result['failed'] = [{'n': point['n'], 'error': point['error']}
+                        for point in report['sizes'] if 'error' in point]
+    measured = {point['n'] for point in report['sizes']}
+    result['skipped'] = [n for n in sizes if n not in measured]
+
+    if len(result['series']) < MIN_POINTS:
+        result['success'] = False
+        result['error'] = result.get('error', '') + (
+            f'Only {len(result["series"])} sizes finished, at least {MIN_POINTS} are needed to fit a curve')
+        return result
+
+    series_sizes = [point['n'] for point in result['series']]
+    result['time_fit'] = fit_complexity(series_sizes, [point['time'] for point in result['series']])
+    result['memory_fit'] = fit_complexity(series_sizes, [point['memory_peak_bytes'] for point in result['series']],
+                                          floor=MEMORY_FLOOR)
+    return result
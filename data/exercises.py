@@ -0,0 +1,81 @@
+"""
+Coding exercises graded against test cases.
+Each exercise names the function a solution must define; test cases give its
+arguments and the expected return value.  Hidden cases are graded but their
+inputs and expected values are not shown to students.
+"""
+
+EXERCISES = {
+    'reverse_array': {
+        'title': 'Reverse an Array',
+        'topic': 'array',
+        'description': 'Write reverse_array(arr) that returns a new list with the elements of arr in reverse order, without using slicing or reversed().',
+        'function_name': 'reverse_array',
+        'starter_code': '''def reverse_array(arr):
+    # Your code here
+    pass
+''',
+        'test_cases': [
+            {'args': [[1, 2, 3, 4, 5]], 'expected': [5, 4, 3, 2, 1]},
+            {'args': [[]], 'expected': []},
+            {'args': [[7]], 'expected': [7]},
+            {'args': [['a', 'b']], 'expected': ['b', 'a']},
+            {'args': [list(range(10000))], 'expected': list(range(9999, -1, -1)), 'hidden': True}
+        ]
+    },
+    'balanced_brackets': {
+        'title': 'Balanced Brackets',
+        'topic': 'stack',
+        'description': 'Write is_balanced(s) that returns True if every bracket in s ((), [] and {}) is closed in the right order, using a stack.',
+        'function_name': 'is_balanced',
+        'starter_code': '''def is_balanced(s):
+    # Your code here
+    pass
+''',
+        'test_cases': [
+            {'args': ['()[]{}'], 'expected': True},
+            {'args': ['([{}])'], 'expected': True},
+            {'args': ['(]'], 'expected': False},
+            {'args': ['(('], 'expected': False},
+            {'args': [''], 'expected': True},
+            {'args': ['a(b)c'], 'expected': True},
+            {'args': ['(' * 5000 + ')' * 5000], 'expected': True, 'hidden': True},
+            {'args': ['}{'], 'expected': False, 'hidden': True}
+        ]
+    },
+    'binary_search': {
+        'title': 'Binary Search',
+        'topic': 'array',
+        'description': 'Write binary_search(arr, target) that returns the index of target in the sorted list arr, or -1 if it is not present. It should run in O(log n).',
+        'function_name': 'binary_search',
+        'starter_code': '''def binary_search(arr, target):
+    # Your code here
+    pass
+''',
+        'test_cases': [
+            {'args': [[1, 3, 5, 7, 9], 7], 'expected': 3},
+            {'args': [[1, 3, 5, 7, 9], 1], 'expected': 0},
+            {'args': [[1, 3, 5, 7, 9], 4], 'expected': -1},
+            {'args': [[], 1], 'expected': -1},
+            {'args': [list(range(0, 200000, 2)), 199998], 'expected': 99999, 'hidden': True}
+        ]
+    },
+    'queue_from_stacks': {
+        'title': 'Queue Using Two Stacks',
+        'topic': 'queue',
+        'description': 'Write process_queue(operations) that simulates a FIFO queue built from two stacks. Each operation is ["enqueue", x] or ["dequeue"]; return the list of dequeued values (None when the queue is empty).',
+        'function_name': 'process_queue',
+        'starter_code': '''def process_queue(operations):
+    inbox, outbox = [], []
+    results = []
+    # Your code here
+    return results
+''',
+        'test_cases': [
+            {'args': [[['enqueue', 1], ['enqueue', 2], ['dequeue'], ['dequeue']]], 'expected': [1, 2]},
+            {'args': [[['dequeue']]], 'expected': [None]},
+            {'args': [[['enqueue', 1], ['dequeue'], ['enqueue', 2], ['enqueue', 3], ['dequeue']]], 'expected': [1, 2]},
+            {'args': [[['enqueue', i] for i in range(1000)] + [['dequeue']] * 1000], 'expected': list(range(1000)), 'hidden': True}
+        ]
+    }
+}
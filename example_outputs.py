@@ -0,0 +1,151 @@
+"""
+Precomputed output for the theory pages' code examples.
+
+Every example in THEORY_CONTENT is run once in the sandbox and its output is
+stored on disk keyed by a content hash of the code, language and interpreter
+version.  Theory pages then show the stored output without executing
+anything, and editing an example only invalidates that example's entry.
+
+Run it as a build step with ``python example_outputs.py``; the app also
+refreshes missing entries in the background at start-up, taking admission
+slots like any other run.  Examples that could not be run (no free worker,
+deadline passed) are not stored, and stored failures are re-run at every
+refresh.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from admission import Rejected
+from code_executor import cache_key, cacheable, execute_batch, result_cache
+from data.theory_content import THEORY_CONTENT
+
+OUTPUTS_PATH = os.environ.get(
+    'EXAMPLE_OUTPUTS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'example_outputs.json')
+)
+PRECOMPUTE_DEADLINE = 120  # seconds for each batch of examples
+ADMISSION_KEY = 'example-outputs'
+
+_outputs = {}
+_lock = threading.Lock()
+
+
+def all_examples():
+    """(code, language) of every theory code example"""
+    return [(example['code'], example.get('language', 'python'))
+            for content in THEORY_CONTENT.values()
+            for example in content.get('code_examples', [])]
+
+
+def load_outputs():
+    """Read stored outputs from disk (an unreadable file counts as empty)"""
+    try:
+        with open(OUTPUTS_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_outputs(outputs):
+    """Write outputs atomically so readers never see a partial file"""
+    os.makedirs(os.path.dirname(OUTPUTS_PATH), exist_ok=True)
+    temp_path = f'{OUTPUTS_PATH}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(outputs, f, indent=1, sort_keys=True)
+    os.replace(temp_path, OUTPUTS_PATH)
+
+
+def run_examples(snippets, admission=None):
+    """
+    execute_batch results for snippets; with an AdmissionController they run
+    in batches that each wait for a ticket with one slot per snippet
+    """
+    if admission is None:
+        return execute_batch(snippets, deadline=PRECOMPUTE_DEADLINE)
+
+    results = []
+    step = min(admission.burst, admission.max_in_flight)
+    for start in range(0, len(snippets), step):
+        batch = snippets[start:start + step]
+        while True:
+            try:
+                ticket = admission.admit(ADMISSION_KEY, cost=len(batch), slots=len(batch))
+                break
+            except Rejected as rejection:
+                time.sleep(rejection.retry_after)
+        results.extend(ticket.run(
+            lambda: execute_batch(batch, deadline=PRECOMPUTE_DEADLINE, concurrency=ticket.slots)
+        ))
+    return results
+
+
+def precompute_example_outputs(admission=None):
+    """
+    Run examples that have no stored output or a stored failure and drop
+    entries no example uses; admission, if given, is the AdmissionController the runs go through
+    """
+    global _outputs
+    stored = load_outputs()
+    examples = {cache_key(code, language): (code, language) for code, language in all_examples()}
+
+    # Failures are re-run too: files written by older versions may hold
+    # errors of runs that never started
+    missing = [key for key in examples if key not in stored or not stored[key]['success']]
+    results = run_examples([examples[key] for key in missing], admission)
+
+    outputs = {key: stored[key] for key in examples if key in stored}
+    unavailable = 0
+    for key, result in zip(missing, results):
+        if result.get('unavailable'):
+            unavailable += 1
+            continue
+        outputs[key] = {
+            'success': result['success'],
+            'output': result.get('output', ''),
+            'error': result.get('error', ''),
+            'execution_time': result.get('execution_time', 0)
+        }
+
+    if outputs != stored:
+        save_outputs(outputs)
+
+    # Running an unchanged example from the code editor can then skip the sandbox
+    for key, output in outputs.items():
+        code, _ = examples[key]
+        if cacheable(code, output):
+            result_cache.put(key, output)
+
+    with _lock:
+        _outputs = outputs
+    logging.info(f"Example outputs ready: {len(outputs)} stored, {len(missing) - unavailable} newly run, "
+                 f"{unavailable} left for the next refresh")
+    return outputs
+
+
+def start_precompute(admission=None):
+    """Refresh example outputs in a background thread"""
+    def run():
+        try:
+            precompute_example_outputs(admission)
+        except Exception as e:
+            logging.error(f"Example output precompute failed: {str(e)}")
+
+    global _outputs
+    with _lock:
+        _outputs = load_outputs()
+    threading.Thread(target=run, name='example-outputs', daemon=True).start()
+
+
+def example_output(code, language='python'):
+    """Stored output for one example, or None if it has not been run yet"""
+    with _lock:
+        return _outputs.get(cache_key(code, language))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    precompute_example_outputs()
@@ -0,0 +1,71 @@
+"""
+Grading of coding exercises against their test cases.
+
+The submission is loaded once in a sandbox worker, and every test case then
+runs in a child forked from that loaded process, several at a time and each
+with its own timeout (see sandbox_worker.grade_cases).
+"""
+
+import math
+import os
+
+from code_executor import EXECUTION_TIMEOUT, run_harness
+
+CASE_TIMEOUT = float(os.environ.get('CODE_EXECUTOR_CASE_TIMEOUT', 2))  # seconds per test case
+PARALLEL_CASES = int(os.environ.get('CODE_EXECUTOR_PARALLEL_CASES', 4))
+GRADE_TIMEOUT = int(os.environ.get('CODE_EXECUTOR_GRADE_TIMEOUT', 30))  # seconds for a whole grading run
+
+
+def grading_timeout(case_count, parallel=PARALLEL_CASES):
+    """Overall time allowed for loading the submission and running its cases"""
+    rounds = math.ceil(case_count / max(1, parallel))
+    return min(GRADE_TIMEOUT, EXECUTION_TIMEOUT + rounds * CASE_TIMEOUT)
+
+
+def case_summary(number, case, outcome):
+    """What the student sees about one test case; hidden cases keep their data"""
+    summary = {
+        'name': f'Test {number}',
+        'hidden': case.get('hidden', False),
+        'passed': outcome.get('passed', False),
+        'elapsed': outcome.get('elapsed'),
+        'timed_out': outcome.get('timed_out', False),
+        'error': outcome.get('error')
+    }
+    if not summary['hidden']:
+        summary['args'] = case['args']
+        summary['expected'] = case['expected']
+        summary['actual'] = outcome.get('actual')
+    return summary
+
+
+def grade_submission(code, exercise_id, exercise, parallel=PARALLEL_CASES):
+    """
+    Run code against every test case of an exercise, parallel cases at a time
+    Returns the execute_code style result (output and errors of loading the
+    code, resource usage) plus exercise_id, tests_passed, tests_total and a
+    per-case list under cases
+    """
+    cases = exercise['test_cases']
+    harness = {
+        'kind': 'grade',
+        'function': exercise['function_name'],
+        'cases': [{'args': case['args'], 'expected': case['expected']} for case in cases],
+        'case_timeout': CASE_TIMEOUT,
+        'parallel': parallel
+    }
+    result, report = run_harness(code, harness, grading_timeout(len(cases), parallel))
+    result.update(exercise_id=exercise_id, tests_passed=0, tests_total=len(cases), cases=[])
+
+    if report is None:
+        result['success'] = False
+        return result
+    if 'error' in report:
+        result['success'] = False
+        result['error'] = result.get('error', '') + report['error']
+        return result
+
+    result['cases'] = [case_summary(number, case, outcome)
+                       for number, (case, outcome) in enumerate(zip(cases, report['cases']), 1)]
+    result['tests_passed'] = sum(1 for case in result['cases'] if case['passed'])
+    return result
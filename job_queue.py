@@ -0,0 +1,116 @@
+"""
+Background job queue for code execution.
+
+Submissions are queued and drained by a bounded set of worker threads so a
+slow run never holds a request thread.  Clients poll (or long-poll) for the
+result by job id.  Jobs live in process memory, so deployments should run a
+single app process with several threads (e.g. gunicorn --workers 1 --threads 8).
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+import logging
+
+
+class QueueFull(Exception):
+    """Raised when the queue already holds its maximum number of pending jobs"""
+
+
+class Job:
+    """A queued unit of work and, once finished, its result"""
+
+    def __init__(self, func, owner):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.owner = owner
+        self.status = 'queued'
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {'job_id': self.id, 'status': self.status}
+        if self.status == 'done':
+            data['result'] = self.result
+        return data
+
+
+class JobQueue:
+    """Bounded FIFO of jobs drained by a fixed number of worker threads"""
+
+    def __init__(self, workers, max_pending, result_ttl=300):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_workers(self):
+        # Threads do not survive a fork, so start them in the serving process
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._drain, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+
+    def _drain(self):
+        while True:
+            job = self._pending.get()
+            job.status = 'running'
+            try:
+                job.result = job.func()
+            except Exception as e:
+                logging.error(f"Job {job.id} failed: {str(e)}")
+                job.result = {'success': False, 'error': f'Server error: {str(e)}'}
+            job.status = 'done'
+            job.finished_at = time.time()
+            job.done.set()
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def submit(self, func, owner):
+        """Queue func() for execution and return its Job"""
+        self._ensure_workers()
+        self._purge_expired()
+        job = Job(func, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._pending.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFull('Execution queue is full')
+        return job
+
+    def get(self, job_id, owner):
+        """Return the job if it exists and belongs to owner"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def wait(self, job_id, owner, timeout):
+        """Like get(), but block up to timeout seconds for the job to finish"""
+        job = self.get(job_id, owner)
+        if job is not None and timeout > 0:
+            job.done.wait(timeout)
+        return job
+
+    def depth(self):
+        """Number of jobs waiting for a worker"""
+        return self._pending.qsize()
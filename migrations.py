@@ -0,0 +1,181 @@
+"""
+Lightweight schema upgrades for existing databases.
+
+db.create_all() only creates missing tables, so databases created by an older
+version of the app would lack columns, indexes and foreign key actions added
+to the models since.  The upgrades here are idempotent and run at every
+start-up after create_all().
+"""
+
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import AddConstraint, CreateTable
+
+
+def add_missing_columns(db):
+    """ALTER TABLE ... ADD COLUMN for model columns the database lacks
+
+    Only nullable columns without server defaults are added this way, which is
+    how new model columns are declared.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    dialect = db.engine.dialect
+    quote = dialect.identifier_preparer.quote
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=dialect)
+                connection.execute(text(
+                    f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}'
+                ))
+                logging.info(f"Added column {table.name}.{column.name}")
+
+
+# Table -> {column: SQL aggregate over a duplicate group} written to the row
+# kept when duplicates are removed.  For progress this is the rule the
+# upserts in progress.py follow: the best score, completed if any row was.
+DUPLICATE_MERGES = {
+    'user_progress': {
+        'score': lambda column: f'MAX(COALESCE({column}, 0))',
+        'completed': lambda column: f'MAX(CASE WHEN {column} THEN 1 ELSE 0 END) = 1',
+    },
+}
+
+
+def delete_duplicate_rows(connection, table, columns, merge=None):
+    """Delete rows that would violate a unique index on columns
+
+    The newest row (highest id) of each duplicate group is kept, after
+    setting the columns in merge ({column: aggregate}, see DUPLICATE_MERGES)
+    to the aggregate over the whole group.  Rows with a NULL in any of the
+    columns never conflict and are left alone.
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    table_name = quote(table.name)
+    names = ', '.join(quote(column) for column in columns)
+    not_null = ' AND '.join(f'{quote(column)} IS NOT NULL' for column in columns)
+    newest = f'SELECT MAX(id) AS keep_id FROM {table_name} WHERE {not_null} GROUP BY {names}'
+
+    if merge:
+        same_group = ' AND '.join(f'duplicate.{quote(column)} = {table_name}.{quote(column)}'
+                                  for column in columns)
+        assignments = ', '.join(
+            f'{quote(column)} = (SELECT {aggregate(f"duplicate.{quote(column)}")} '
+            f'FROM {table_name} AS duplicate WHERE {same_group})'
+            for column, aggregate in merge.items()
+        )
+        connection.execute(text(
+            f'UPDATE {table_name} SET {assignments} WHERE id IN ('
+            f'SELECT keep_id FROM ({newest} HAVING COUNT(*) > 1) AS kept)'
+        ))
+
+    result = connection.execute(text(
+        f'DELETE FROM {table_name} WHERE {not_null} AND id NOT IN ('
+        f'SELECT keep_id FROM ({newest}) AS newest)'
+    ))
+    if result.rowcount:
+        logging.info(f"Removed {result.rowcount} duplicate rows from {table.name} ({', '.join(columns)})")
+
+
+def add_missing_indexes(db):
+    """CREATE INDEX for model indexes the database lacks
+
+    Duplicates are removed first where the index is unique, since the index
+    could not be built over them.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if index.unique:
+                    delete_duplicate_rows(connection, table, [column.name for column in index.columns],
+                                          DUPLICATE_MERGES.get(table.name))
+                index.create(connection)
+                logging.info(f"Added index {index.name} on {table.name}")
+
+
+def rebuild_sqlite_table(db, table):
+    """Recreate a SQLite table from its model, keeping its rows
+
+    SQLite cannot alter constraints, so the table is created under a new
+    name, filled, and renamed over the old one with foreign keys off.
+    """
+    quote = db.engine.dialect.identifier_preparer.quote
+    existing_columns = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    columns = ', '.join(quote(column.name) for column in table.columns if column.name in existing_columns)
+    rebuilt = table.to_metadata(db.metadata, name=f'{table.name}_rebuild')
+    try:
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
+            with connection.begin():
+                connection.execute(CreateTable(rebuilt))
+                connection.execute(text(
+                    f'INSERT INTO {quote(rebuilt.name)} ({columns}) SELECT {columns} FROM {quote(table.name)}'
+                ))
+                connection.execute(text(f'DROP TABLE {quote(table.name)}'))
+                connection.execute(text(f'ALTER TABLE {quote(rebuilt.name)} RENAME TO {quote(table.name)}'))
+                for index in table.indexes:
+                    index.create(connection)
+            connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+            connection.commit()
+    finally:
+        db.metadata.remove(rebuilt)
+
+
+def update_foreign_key_actions(db):
+    """Recreate foreign keys whose ON DELETE action differs from the models'"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    quote = db.engine.dialect.identifier_preparer.quote
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {tuple(fk['constrained_columns']): fk for fk in inspector.get_foreign_keys(table.name)}
+        outdated = []
+        for constraint in table.foreign_key_constraints:
+            if not constraint.ondelete:
+                continue
+            fk = existing.get(tuple(constraint.column_keys))
+            if fk is None or (fk['options'].get('ondelete') or '').upper() != constraint.ondelete.upper():
+                outdated.append((constraint, fk))
+        if not outdated:
+            continue
+
+        if db.engine.dialect.name == 'sqlite':
+            rebuild_sqlite_table(db, table)
+        else:
+            with db.engine.begin() as connection:
+                for constraint, fk in outdated:
+                    if fk is not None and fk.get('name'):
+                        connection.execute(text(
+                            f'ALTER TABLE {quote(table.name)} DROP CONSTRAINT {quote(fk["name"])}'
+                        ))
+                    connection.execute(AddConstraint(constraint))
+        logging.info(f"Updated ON DELETE actions of {table.name}")
+
+
+def upgrade_database(db):
+    """Bring an existing database up to date with the models"""
+    add_missing_columns(db)
+    add_missing_indexes(db)
+    update_foreign_key_actions(db)
+
+    # Submissions stored before text was deduplicated
+    from blobs import backfill_blobs
+    backfill_blobs()
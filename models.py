@@ -1,5 +1,6 @@
 from app import db
 from datetime import datetime
+import zlib
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -13,15 +14,16 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     is_blocked = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     last_login = db.Column(db.DateTime)
     blocked_at = db.Column(db.DateTime)
     blocked_reason = db.Column(db.Text)
     
     # Relationships
-    progress_records = db.relationship('UserProgress', backref='user', lazy=True)
-    quiz_attempts = db.relationship('QuizAttempt', backref='user', lazy=True)
-    code_submissions = db.relationship('CodeSubmission', backref='user', lazy=True)
+    # The database deletes a user's rows with the user (ON DELETE CASCADE)
+    progress_records = db.relationship('UserProgress', backref='user', lazy=True, passive_deletes=True)
+    quiz_attempts = db.relationship('QuizAttempt', backref='user', lazy=True, passive_deletes=True)
+    code_submissions = db.relationship('CodeSubmission', backref='user', lazy=True, passive_deletes=True)
     
     def set_password(self, password):
         """Set password hash"""
@@ -52,34 +54,111 @@ class User(UserMixin, db.Model):
 
 class UserProgress(db.Model):
     """Track user progress through different modules"""
+    # One record per owner and section; the unique indexes also serve the
+    # per-page lookups by owner, module and section
+    __table_args__ = (
+        db.Index('ix_user_progress_user_section', 'user_id', 'module_name', 'section_name', unique=True),
+        db.Index('ix_user_progress_session_section', 'session_id', 'module_name', 'section_name', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
     session_id = db.Column(db.String(128), nullable=True)  # For anonymous users
     module_name = db.Column(db.String(64), nullable=False)
     section_name = db.Column(db.String(64), nullable=False)
     completed = db.Column(db.Boolean, default=False)
     score = db.Column(db.Integer, default=0)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class QuizAttempt(db.Model):
     """Store quiz attempts and scores"""
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    session_id = db.Column(db.String(128), nullable=True)  # For anonymous users
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True)
+    session_id = db.Column(db.String(128), nullable=True, index=True)  # For anonymous users
     quiz_id = db.Column(db.String(64), nullable=False)
     question_id = db.Column(db.String(64), nullable=False)
     user_answer = db.Column(db.Text)
     correct = db.Column(db.Boolean, default=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class CodeSubmission(db.Model):
     """Store code submissions and execution results"""
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    session_id = db.Column(db.String(128), nullable=True)  # For anonymous users
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True)
+    session_id = db.Column(db.String(128), nullable=True, index=True)  # For anonymous users
     language = db.Column(db.String(32), nullable=False)
-    code = db.Column(db.Text, nullable=False)
-    output = db.Column(db.Text)
-    error = db.Column(db.Text)
+    # Text is kept inline when short; longer text is a SubmissionBlob
+    # referenced by hash and the inline column holds ''
+    code_text = db.Column('code', db.Text, nullable=False, default='')
+    output_text = db.Column('output', db.Text)
+    error_text = db.Column('error', db.Text)
+    code_hash = db.Column(db.String(64), db.ForeignKey('submission_blob.hash'), index=True)
+    output_hash = db.Column(db.String(64), db.ForeignKey('submission_blob.hash'), index=True)
+    error_hash = db.Column(db.String(64), db.ForeignKey('submission_blob.hash'), index=True)
     execution_time = db.Column(db.Float)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    peak_rss_kb = db.Column(db.Integer)
+    cpu_user_time = db.Column(db.Float)
+    cpu_system_time = db.Column(db.Float)
+    kill_reason = db.Column(db.String(32))  # limit that stopped the run, if any
+    exercise_id = db.Column(db.String(64))  # set when the code was graded against an exercise
+    tests_passed = db.Column(db.Integer)
+    tests_total = db.Column(db.Integer)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    code_blob = db.relationship('SubmissionBlob', foreign_keys=[code_hash])
+    output_blob = db.relationship('SubmissionBlob', foreign_keys=[output_hash])
+    error_blob = db.relationship('SubmissionBlob', foreign_keys=[error_hash])
+
+    @property
+    def code(self):
+        return self.code_blob.text if self.code_hash else self.code_text
+
+    @property
+    def output(self):
+        return self.output_blob.text if self.output_hash else self.output_text
+
+    @property
+    def error(self):
+        return self.error_blob.text if self.error_hash else self.error_text
+
+class SubmissionBlob(db.Model):
+    """Deduplicated text of code submissions, keyed by its SHA-256 (see blobs.py)"""
+    hash = db.Column(db.String(64), primary_key=True)
+    encoding = db.Column(db.String(16), nullable=False)  # 'raw' or 'zlib'
+    size = db.Column(db.Integer, nullable=False)  # bytes of UTF-8 text before compression
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    @property
+    def text(self):
+        data = zlib.decompress(self.data) if self.encoding == 'zlib' else self.data
+        return data.decode('utf-8')
+
+class StatCounter(db.Model):
+    """Running platform totals, updated on write (see stats.py)"""
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyStats(db.Model):
+    """Activity totals per UTC day, updated on write (see stats.py)"""
+    day = db.Column(db.Date, primary_key=True)
+    active_users = db.Column(db.Integer, nullable=False, default=0)  # refreshed by the reconciler
+    new_users = db.Column(db.Integer, nullable=False, default=0)
+    code_submissions = db.Column(db.Integer, nullable=False, default=0)
+    quiz_attempts = db.Column(db.Integer, nullable=False, default=0)
+
+class QuizAttemptRollup(db.Model):
+    """Daily totals of QuizAttempt rows removed by retention (see retention.py)"""
+    day = db.Column(db.Date, primary_key=True)
+    quiz_id = db.Column(db.String(64), primary_key=True)
+    anonymous = db.Column(db.Boolean, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+class CodeSubmissionRollup(db.Model):
+    """Daily totals of CodeSubmission rows removed by retention (see retention.py)"""
+    day = db.Column(db.Date, primary_key=True)
+    language = db.Column(db.String(32), primary_key=True)
+    anonymous = db.Column(db.Boolean, primary_key=True)
+    submissions = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    execution_time = db.Column(db.Float, nullable=False, default=0)  # seconds, summed
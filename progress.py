@@ -0,0 +1,256 @@
+"""
+Recording of UserProgress.
+
+A progress write is one INSERT ... ON CONFLICT DO UPDATE against the unique
+(owner, module, section) indexes, so it costs a single round trip and two
+tabs writing the same section cannot create duplicate rows.  The stored score
+only ever goes up.  Dialects without ON CONFLICT fall back to read-then-write.
+
+Theory page views go through ProgressBuffer instead: "viewed" is idempotent
+and nobody waits on it, so views are collected in memory and written in
+batches off the request path.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import UserProgress
+
+UPSERT_DIALECTS = {
+    'sqlite': (sqlite.insert, func.max),
+    'postgresql': (postgresql.insert, func.greatest),
+}
+
+
+def progress_values(identity, module_name, section_name, score):
+    """UserProgress column values for a completed section"""
+    return dict(**identity, module_name=module_name, section_name=section_name,
+                completed=True, score=score)
+
+
+def upsert_statement(dialect_insert, greatest, owner):
+    """INSERT a row, or mark the existing one completed and keep the best score"""
+    table = UserProgress.__table__
+    statement = dialect_insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c[owner], table.c.module_name, table.c.section_name],
+        set_={
+            'completed': table.c.completed | statement.excluded.completed,
+            'score': greatest(func.coalesce(table.c.score, 0), func.coalesce(statement.excluded.score, 0)),
+        }
+    )
+
+
+def merge_progress(owner, values):
+    """Read-then-write for databases without ON CONFLICT"""
+    progress = UserProgress.query.filter_by(
+        **{owner: values[owner]},
+        module_name=values['module_name'],
+        section_name=values['section_name']
+    ).first()
+    if not progress:
+        db.session.add(UserProgress(**values))
+    else:
+        progress.score = max(progress.score or 0, values['score'])
+        progress.completed = True
+
+
+def write_progress(rows):
+    """Upsert progress rows, one executemany per owner column; the caller commits"""
+    upsert = UPSERT_DIALECTS.get(db.engine.dialect.name)
+    for owner in ('user_id', 'session_id'):
+        group = [row for row in rows if row.get(owner) is not None]
+        if not group:
+            continue
+        if upsert:
+            db.session.execute(upsert_statement(*upsert, owner), group)
+        else:
+            for row in group:
+                merge_progress(owner, row)
+
+
+def record_progress(identity, module_name, section_name, score=0):
+    """
+    Mark a section completed for the given identity ({'user_id': ...} or
+    {'session_id': ...}), keeping the higher of the stored and given score.
+    The caller commits.
+    """
+    write_progress([progress_values(identity, module_name, section_name, score)])
+
+
+def move_session_progress(session_id, user_id):
+    """
+    Move an anonymous session's progress to an account.  Where both have a
+    record of the same section the account's is kept, completed if either
+    was and with the higher score.  The caller commits.
+    """
+    table = UserProgress.__table__
+    anonymous = (table.c.session_id == session_id) & table.c.user_id.is_(None)
+    upsert = UPSERT_DIALECTS.get(db.engine.dialect.name)
+    if upsert:
+        columns = ['user_id', 'module_name', 'section_name', 'completed', 'score', 'timestamp']
+        rows = select(literal(user_id), table.c.module_name, table.c.section_name,
+                      table.c.completed, table.c.score, table.c.timestamp).where(anonymous)
+        db.session.execute(upsert_statement(*upsert, 'user_id').from_select(columns, rows))
+    else:
+        for progress in UserProgress.query.filter(anonymous).all():
+            merge_progress('user_id', progress_values({'user_id': user_id}, progress.module_name,
+                                                      progress.section_name, progress.score or 0))
+    db.session.execute(table.delete().where(anonymous))
+
+
+class ProgressBuffer:
+    """
+    Bounded write-behind buffer of progress records
+
+    record() only touches memory: repeated records of the same identity and
+    section collapse into one, and a background thread writes the buffer in
+    one batch every flush_interval seconds, as soon as flush_size records are
+    waiting, and at interpreter exit.  Records that arrive while max_pending
+    are already waiting are refused so the caller can write them directly.
+    """
+
+    def __init__(self, app, flush_interval, flush_size, max_pending):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.last_batch = 0
+        self.largest_batch = 0
+        self.failures = 0
+        self.refused = 0
+        self._pending = {}  # (owner, module, section) -> row values
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        atexit.register(self.close)
+
+    def _ensure_flusher(self):
+        # Threads do not survive a fork, so start it in the serving process
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='progress-flusher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _merge(self, key, values):
+        # Called with self._lock held
+        buffered = self._pending.get(key)
+        if buffered is not None:
+            buffered['score'] = max(buffered['score'], values['score'])
+        elif len(self._pending) < self.max_pending:
+            self._pending[key] = values
+        else:
+            return False
+        return True
+
+    def record(self, identity, module_name, section_name, score=0):
+        """Buffer a progress record; False if the buffer is full"""
+        self._ensure_flusher()
+        key = (*identity.items(), module_name, section_name)
+        with self._lock:
+            accepted = self._merge(key, progress_values(identity, module_name, section_name, score))
+            if not accepted:
+                self.refused += 1
+            if len(self._pending) >= self.flush_size:
+                self._wake.set()
+        return accepted
+
+    def pending_for(self, identity):
+        """Buffered rows of one identity, not yet in the database"""
+        owner = tuple(identity.items())
+        with self._lock:
+            return [dict(values) for key, values in self._pending.items()
+                    if key[:len(owner)] == owner]
+
+    def reassign(self, identity, to_identity):
+        """
+        Move buffered records of one identity to another, e.g. at login.
+        Waits for a flush in progress, so once this returns no record of
+        identity is still on its way to the database: call it before the
+        caller's transaction writes anything, as that flush may need the
+        database lock.
+        """
+        owner = tuple(identity.items())
+        with self._flush_lock, self._lock:
+            for key in [key for key in self._pending if key[:len(owner)] == owner]:
+                values = self._pending.pop(key)
+                for column in identity:
+                    del values[column]
+                values.update(to_identity)
+                self._merge((*to_identity.items(), *key[len(owner):]), values)
+
+    def flush(self):
+        """Write everything buffered in one batch; returns the batch size"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            with self.app.app_context():
+                try:
+                    write_progress(list(batch.values()))
+                    db.session.commit()
+                except IntegrityError:
+                    # Typically views of a user deleted since; write the rest
+                    db.session.rollback()
+                    self._write_one_by_one(batch.values())
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Progress flush of {len(batch)} records failed: {str(e)}")
+                    with self._lock:
+                        self.failures += 1
+                        for key, values in batch.items():
+                            self._merge(key, values)
+                    return 0
+            with self._lock:
+                self.flushes += 1
+                self.rows_flushed += len(batch)
+                self.last_batch = len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+            logging.debug(f"Flushed {len(batch)} progress records")
+            return len(batch)
+
+    def _write_one_by_one(self, rows):
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    write_progress([row])
+            except IntegrityError as e:
+                logging.warning(f"Dropped buffered progress record {row}: {str(e)}")
+        db.session.commit()
+
+    def close(self):
+        """Flush what is left; registered to run at interpreter exit"""
+        if self._pid == os.getpid():
+            self.flush()
+
+    def stats(self):
+        """Buffer depth and flush batch sizes, for monitoring"""
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'flushes': self.flushes,
+                'rows_flushed': self.rows_flushed,
+                'mean_batch': self.rows_flushed / self.flushes if self.flushes else 0,
+                'last_batch': self.last_batch,
+                'largest_batch': self.largest_batch,
+                'failures': self.failures,
+                'refused': self.refused
+            }
@@ -0,0 +1,68 @@
+"""
+Answer index of the quizzes, compiled once at import.
+
+QUIZ_DATA is walked a single time into read-only mappings of quiz id ->
+question id -> AnswerKey, so grading a submission is one dictionary lookup
+per answer.  Scores are weighted by each question's 'points'.
+"""
+
+from collections import namedtuple
+from types import MappingProxyType
+
+from data.quiz_data import QUIZ_DATA
+
+AnswerKey = namedtuple('AnswerKey', ['correct_answer', 'points', 'explanation'])
+QuizKey = namedtuple('QuizKey', ['questions', 'total_points'])
+
+DEFAULT_POINTS = 1  # for questions that do not set 'points'
+
+
+def compile_quiz(quiz):
+    """The QuizKey of one quiz"""
+    questions = {}
+    for question in quiz['questions']:
+        if question['id'] in questions:
+            raise ValueError(f"Duplicate question id {question['id']}")
+        questions[question['id']] = AnswerKey(
+            correct_answer=question['correct_answer'],
+            points=question.get('points', DEFAULT_POINTS),
+            explanation=question.get('explanation', '')
+        )
+    return QuizKey(MappingProxyType(questions), sum(key.points for key in questions.values()))
+
+
+def compile_quiz_index(quiz_data):
+    """Read-only mapping of quiz id to its QuizKey"""
+    return MappingProxyType({quiz_id: compile_quiz(quiz) for quiz_id, quiz in quiz_data.items()})
+
+
+QUIZ_INDEX = compile_quiz_index(QUIZ_DATA)
+
+
+def grade_quiz(quiz_key, answers):
+    """
+    Grade answers ({question id: answer}) against a QuizKey
+    Returns (score as a percentage of the quiz's points, points earned,
+    number of correct answers, per-question results); answers to unknown
+    questions are ignored
+    """
+    earned = 0
+    correct_answers = 0
+    results = {}
+    for question_id, user_answer in answers.items():
+        key = quiz_key.questions.get(question_id)
+        if key is None:
+            continue
+        is_correct = user_answer == key.correct_answer
+        if is_correct:
+            earned += key.points
+            correct_answers += 1
+        results[question_id] = {
+            'correct': is_correct,
+            'user_answer': user_answer,
+            'correct_answer': key.correct_answer,
+            'explanation': key.explanation,
+            'points': key.points if is_correct else 0
+        }
+    score = int(earned * 100 / quiz_key.total_points) if quiz_key.total_points else 0
+    return score, earned, correct_answers, results
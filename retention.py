@@ -0,0 +1,180 @@
+"""
+Retention of QuizAttempt and CodeSubmission rows.
+
+Rows older than their table's retention (set separately for anonymous
+sessions and accounts) are removed by a maintenance job that runs every
+RETENTION_INTERVAL seconds, or once with ``python retention.py``.  Each batch
+of at most RETENTION_BATCH rows is, in one transaction:
+
+1. deleted, and skipped if another process deleted any of it first,
+2. added to the daily rollup tables (QuizAttemptRollup, CodeSubmissionRollup),
+3. appended to a gzip-compressed NDJSON file per table and day under
+   RETENTION_ARCHIVE_DIR (unless that is empty), flushed before the commit,
+
+so no lock is held for longer than one batch.  Blobs no submission refers
+to any more are deleted afterwards.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.orm import selectinload
+
+from app import db
+from models import QuizAttempt, CodeSubmission, QuizAttemptRollup, CodeSubmissionRollup
+from blobs import delete_unreferenced_blobs
+from stats import increment
+
+RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', 86400))  # seconds; 0 disables the schedule
+RETENTION_BATCH = int(os.environ.get('RETENTION_BATCH', 500))
+ARCHIVE_DIR = os.environ.get(
+    'RETENTION_ARCHIVE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'archive')
+)
+
+
+def retention_days(table, owner):
+    """Days rows of table are kept for owner ('anonymous' or 'user'); 0 keeps them forever"""
+    default = 90 if owner == 'anonymous' else 0
+    return int(os.environ.get(f'RETENTION_{table.upper()}_{owner.upper()}_DAYS', default))
+
+
+def quiz_attempt_rollup(attempts):
+    """QuizAttemptRollup increments for a batch of attempts"""
+    rollup = defaultdict(lambda: {'attempts': 0, 'correct': 0})
+    for attempt in attempts:
+        counts = rollup[(attempt.timestamp.date(), attempt.quiz_id, attempt.user_id is None)]
+        counts['attempts'] += 1
+        counts['correct'] += 1 if attempt.correct else 0
+    return rollup
+
+
+def code_submission_rollup(submissions):
+    """CodeSubmissionRollup increments for a batch of submissions"""
+    rollup = defaultdict(lambda: {'submissions': 0, 'errors': 0, 'execution_time': 0.0})
+    for submission in submissions:
+        counts = rollup[(submission.timestamp.date(), submission.language, submission.user_id is None)]
+        counts['submissions'] += 1
+        counts['errors'] += 1 if submission.error_hash or submission.error_text else 0
+        counts['execution_time'] += submission.execution_time or 0
+    return rollup
+
+
+def archived_row(row, columns):
+    """JSON-ready dict of a row's columns"""
+    values = {}
+    for column in columns:
+        value = getattr(row, column)
+        values[column] = value.isoformat() if isinstance(value, (date, datetime)) else value
+    return values
+
+
+# Retained models: (rollup model, rollup function, columns written to the
+# archive, loader options for what the archive reads)
+RETAINED = {
+    QuizAttempt: (QuizAttemptRollup, quiz_attempt_rollup,
+                  ['id', 'user_id', 'session_id', 'quiz_id', 'question_id', 'user_answer',
+                   'correct', 'timestamp'],
+                  []),
+    CodeSubmission: (CodeSubmissionRollup, code_submission_rollup,
+                     ['id', 'user_id', 'session_id', 'language', 'code', 'output', 'error',
+                      'execution_time', 'peak_rss_kb', 'cpu_user_time', 'cpu_system_time',
+                      'kill_reason', 'exercise_id', 'tests_passed', 'tests_total', 'timestamp'],
+                     [selectinload(CodeSubmission.code_blob), selectinload(CodeSubmission.output_blob),
+                      selectinload(CodeSubmission.error_blob)]),
+}
+
+
+def archive_rows(model, rows, columns):
+    """Append rows to today's archive file of model's table"""
+    if not ARCHIVE_DIR:
+        return
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, f"{model.__tablename__}-{datetime.utcnow():%Y%m%d}.ndjson.gz")
+    lines = ''.join(json.dumps(archived_row(row, columns), default=str) + '\n' for row in rows)
+    # Each append is a complete gzip member; readers see one stream
+    with open(path, 'ab') as archive:
+        with gzip.GzipFile(fileobj=archive, mode='wb') as member:
+            member.write(lines.encode('utf-8'))
+        archive.flush()
+        os.fsync(archive.fileno())
+
+
+def expire_batch(model, expired):
+    """Roll up, archive and delete one batch of expired rows; returns rows removed"""
+    rollup_model, rollup, columns, options = RETAINED[model]
+    rows = model.query.options(*options).filter(expired).order_by(model.id).limit(RETENTION_BATCH).all()
+    if not rows:
+        return 0
+
+    ids = [row.id for row in rows]
+    deleted = model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+    if deleted != len(rows):
+        # Another process is expiring the same rows; leave them to it
+        db.session.rollback()
+        return 0
+
+    key_columns = [column.name for column in rollup_model.__table__.primary_key.columns]
+    for key, counts in rollup(rows).items():
+        increment(rollup_model, dict(zip(key_columns, key)), counts)
+    archive_rows(model, rows, columns)
+    db.session.commit()
+    return deleted
+
+
+def expire_rows(model):
+    """Remove every row of model past its retention; returns rows removed"""
+    removed = 0
+    for owner, owner_filter in (('anonymous', model.user_id.is_(None)),
+                                ('user', model.user_id.isnot(None))):
+        days = retention_days(model.__tablename__, owner)
+        if days <= 0:
+            continue
+        expired = owner_filter & (model.timestamp < datetime.utcnow() - timedelta(days=days))
+        while True:
+            count = expire_batch(model, expired)
+            if not count:
+                break
+            removed += count
+    return removed
+
+
+def run_retention():
+    """Expire old rows of every retained table and drop blobs left unreferenced"""
+    for model in RETAINED:
+        removed = expire_rows(model)
+        if removed:
+            logging.info(f"Retention removed {removed} {model.__tablename__} rows")
+    delete_unreferenced_blobs()
+
+
+def start_retention(app):
+    """Run the retention job every RETENTION_INTERVAL seconds in a background thread"""
+    if RETENTION_INTERVAL <= 0:
+        return
+
+    def run():
+        while True:
+            time.sleep(RETENTION_INTERVAL)
+            with app.app_context():
+                try:
+                    run_retention()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Retention run failed: {str(e)}")
+
+    threading.Thread(target=run, name='retention', daemon=True).start()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    logging.basicConfig(level=logging.INFO)
+    with app.app_context():
+        run_retention()
@@ -1,10 +1,21 @@
-from flask import render_template, request, jsonify, session, redirect, url_for, flash
+from flask import render_template, request, jsonify, session, redirect, url_for, flash, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from app import app, db
 from models import User, UserProgress, QuizAttempt, CodeSubmission
-from code_executor import execute_code
+from code_executor import execute_code, execute_batch, stream_code, trace_code, result_cache, BATCH_MAX_SNIPPETS
+from job_queue import JobQueue, QueueFull
+from admission import AdmissionController, Rejected
+from example_outputs import example_output
+from grader import grade_submission, PARALLEL_CASES
+from complexity import measure_complexity, COMPLEXITY_PARALLEL
+from progress import record_progress, ProgressBuffer
 from data.theory_content import THEORY_CONTENT
 from data.quiz_data import QUIZ_DATA
+from quiz_index import QUIZ_INDEX, grade_quiz
+from stats import count_activity, platform_stats
+from blobs import text_columns
+from accounts import remove_user, merge_anonymous_activity
+from data.exercises import EXERCISES
 import uuid
 import logging
 from datetime import datetime
@@ -12,6 +23,8 @@ import os
 import json
 from urllib import request as urlrequest
 from urllib.error import URLError, HTTPError
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
 
 @app.before_request
 def before_request():
@@ -19,6 +32,17 @@ def before_request():
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
 
+def claim_session_activity(user):
+    """
+    Move what was recorded for this browser session before login to user;
+    call it before the request has written anything.  The caller commits.
+    """
+    anonymous = {'session_id': session['session_id']}
+    # Buffered records first: once reassign() returns, a flush that took
+    # them under the session has committed, and the merge below sees them
+    progress_buffer.reassign(anonymous, {'user_id': user.id})
+    merge_anonymous_activity(anonymous['session_id'], user.id)
+
 # Authentication routes
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -35,6 +59,7 @@ def login():
             
             login_user(user)
             user.last_login = datetime.utcnow()
+            claim_session_activity(user)
             db.session.commit()
             
             flash(f'Welcome back, {user.username}!', 'success')
@@ -67,6 +92,9 @@ def register():
         user = User(username=username, email=email)
         user.set_password(password)
         db.session.add(user)
+        count_activity(users=1)
+        db.session.commit()
+        claim_session_activity(user)
         db.session.commit()
         
         login_user(user)
@@ -91,19 +119,21 @@ def admin_dashboard():
         flash('Access denied: Admin privileges required', 'danger')
         return redirect(url_for('index'))
     
-    # Get statistics
-    total_users = User.query.count()
-    total_submissions = CodeSubmission.query.count()
-    total_quiz_attempts = QuizAttempt.query.count()
+    # Get statistics, maintained on write
+    totals, daily_stats = platform_stats()
     
     # Recent activity
     recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
-    recent_submissions = CodeSubmission.query.order_by(CodeSubmission.timestamp.desc()).limit(10).all()
+    # The template shows whether each submission failed, which may read its error blob
+    recent_submissions = CodeSubmission.query.options(selectinload(CodeSubmission.error_blob)) \
+        .order_by(CodeSubmission.timestamp.desc()).limit(10).all()
     
     return render_template('admin_dashboard.html',
-                         total_users=total_users,
-                         total_submissions=total_submissions,
-                         total_quiz_attempts=total_quiz_attempts,
+                         total_users=totals['users'],
+                         total_submissions=totals['code_submissions'],
+                         total_quiz_attempts=totals['quiz_attempts'],
+                         daily_stats=daily_stats,
+                         today=datetime.utcnow().date(),
                          recent_users=recent_users,
                          recent_submissions=recent_submissions)
 
@@ -167,15 +197,16 @@ def delete_user(user_id):
     
     username = user.username
     
-    # Delete related records
-    UserProgress.query.filter_by(user_id=user_id).delete()
-    QuizAttempt.query.filter_by(user_id=user_id).delete()
-    CodeSubmission.query.filter_by(user_id=user_id).delete()
-    
-    # Delete the user
-    db.session.delete(user)
-    db.session.commit()
+    # Related records go with the user (ON DELETE CASCADE); "async": true
+    # deletes them in the background in batches
+    data = request.get_json(silent=True) or {}
+    try:
+        queued = remove_user(user, in_background=bool(data.get('async')))
+    except QueueFull:
+        return jsonify({'success': False, 'error': 'Too many deletions are pending, please try again shortly'}), 503
     
+    if queued:
+        return jsonify({'success': True, 'message': f'User {username} has been blocked and is being deleted'})
     return jsonify({'success': True, 'message': f'User {username} has been deleted'})
 
 @app.route('/profile')
@@ -189,7 +220,8 @@ def user_profile():
     
     # Get recent activity
     recent_progress = UserProgress.query.filter_by(user_id=current_user.id).order_by(UserProgress.timestamp.desc()).limit(5).all()
-    recent_submissions = CodeSubmission.query.filter_by(user_id=current_user.id).order_by(CodeSubmission.timestamp.desc()).limit(5).all()
+    recent_submissions = CodeSubmission.query.options(selectinload(CodeSubmission.error_blob)) \
+        .filter_by(user_id=current_user.id).order_by(CodeSubmission.timestamp.desc()).limit(5).all()
     
     return render_template('user_profile.html',
                          progress_count=progress_count,
@@ -203,20 +235,17 @@ def user_profile():
 def delete_account():
     """Delete current user's account"""
     user_id = current_user.id
-    username = current_user.username
-    
-    # Delete related records
-    UserProgress.query.filter_by(user_id=user_id).delete()
-    QuizAttempt.query.filter_by(user_id=user_id).delete()
-    CodeSubmission.query.filter_by(user_id=user_id).delete()
     
     # Logout user first
     logout_user()
     
-    # Delete the user
+    # Related records go with the user (ON DELETE CASCADE)
     user = User.query.get(user_id)
-    db.session.delete(user)
-    db.session.commit()
+    try:
+        remove_user(user)
+    except QueueFull:
+        flash('Your account could not be deleted right now, please try again shortly.', 'danger')
+        return redirect(url_for('index'))
     
     flash('Your account has been successfully deleted.', 'success')
     return redirect(url_for('index'))
@@ -243,61 +272,128 @@ def theory(data_structure=None):
     if data_structure and data_structure in THEORY_CONTENT:
         content = THEORY_CONTENT[data_structure]
         
-        # Mark as viewed
-        if current_user.is_authenticated:
-            progress = UserProgress.query.filter_by(
-                user_id=current_user.id,
-                module_name='theory',
-                section_name=data_structure
-            ).first()
-            
-            if not progress:
-                progress = UserProgress(
-                    user_id=current_user.id,
-                    module_name='theory',
-                    section_name=data_structure,
-                    completed=True
-                )
-                db.session.add(progress)
-                db.session.commit()
-        else:
-            # For anonymous users
-            progress = UserProgress.query.filter_by(
-                session_id=session['session_id'],
-                module_name='theory',
-                section_name=data_structure
-            ).first()
-            
-            if not progress:
-                progress = UserProgress(
-                    session_id=session['session_id'],
-                    module_name='theory',
-                    section_name=data_structure,
-                    completed=True
-                )
-                db.session.add(progress)
-                db.session.commit()
+        # Mark as viewed; written in the background unless the buffer is full
+        identity = current_identity()
+        if not progress_buffer.record(identity, 'theory', data_structure):
+            record_progress(identity, 'theory', data_structure)
+            db.session.commit()
+        
+        outputs = [example_output(example['code'], example.get('language', 'python'))
+                   for example in content.get('code_examples', [])]
         
         return render_template('theory.html', 
                              content=content, 
+                             example_outputs=outputs,
                              data_structure=data_structure,
                              theory_sections=list(THEORY_CONTENT.keys()))
     
     return render_template('theory.html', 
                          theory_sections=list(THEORY_CONTENT.keys()))
 
+progress_buffer = ProgressBuffer(
+    app,
+    flush_interval=float(os.environ.get('PROGRESS_FLUSH_INTERVAL', 2)),
+    flush_size=int(os.environ.get('PROGRESS_FLUSH_SIZE', 200)),
+    max_pending=int(os.environ.get('PROGRESS_BUFFER_SIZE', 10000))
+)
+
 @app.route('/code-editor')
 def code_editor():
     """Live code editor with execution capability"""
     return render_template('code_editor.html')
 
+def current_identity():
+    """Column values identifying the current visitor (account or anonymous session)"""
+    if current_user.is_authenticated:
+        return {'user_id': current_user.id}
+    return {'session_id': session['session_id']}
+
+def submission_values(identity, language, code, result):
+    """CodeSubmission column values for an execution result"""
+    return dict(
+        **identity,
+        language=language,
+        **text_columns(code=code, output=result.get('output', ''), error=result.get('error', '')),
+        execution_time=result.get('execution_time', 0),
+        peak_rss_kb=result.get('peak_rss_kb'),
+        cpu_user_time=result.get('cpu_user_time'),
+        cpu_system_time=result.get('cpu_system_time'),
+        kill_reason=result.get('kill_reason'),
+        exercise_id=result.get('exercise_id'),
+        tests_passed=result.get('tests_passed'),
+        tests_total=result.get('tests_total')
+    )
+
+def store_submission(identity, language, code, result):
+    """Record an execution result as a CodeSubmission for the given identity"""
+    submission = CodeSubmission(**submission_values(identity, language, code, result))
+    db.session.add(submission)
+    count_activity(code_submissions=1)
+    db.session.commit()
+
+def submission_response(result):
+    """Fields of an execution result returned to the browser"""
+    return {
+        'success': result['success'],
+        'output': result.get('output', ''),
+        'error': result.get('error', ''),
+        'execution_time': result.get('execution_time', 0),
+        'cache_hit': result.get('cache_hit', False),
+        'peak_rss_kb': result.get('peak_rss_kb'),
+        'cpu_user_time': result.get('cpu_user_time'),
+        'cpu_system_time': result.get('cpu_system_time'),
+        'kill_reason': result.get('kill_reason'),
+        'profile': result.get('profile')
+    }
+
+def run_and_store_submission(identity, language, code, profile=False):
+    """Execute code and record it as a CodeSubmission for the given identity"""
+    result = execute_code(code, language, profile=profile)
+    store_submission(identity, language, code, result)
+    return submission_response(result)
+
+JOB_POLL_MAX_WAIT = float(os.environ.get('CODE_EXECUTOR_POLL_MAX_WAIT', 1))  # seconds
+
+execution_queue = JobQueue(
+    workers=int(os.environ.get('CODE_EXECUTOR_QUEUE_WORKERS', 4)),
+    max_pending=int(os.environ.get('CODE_EXECUTOR_QUEUE_SIZE', 100))
+)
+
+execution_admission = AdmissionController(
+    max_in_flight=int(os.environ.get('CODE_EXECUTOR_MAX_IN_FLIGHT', 4)),
+    max_queue_depth=int(os.environ.get('CODE_EXECUTOR_MAX_QUEUE_DEPTH', 50)),
+    per_key_limit=int(os.environ.get('CODE_EXECUTOR_PER_USER_CONCURRENCY', 2)),
+    rate=float(os.environ.get('CODE_EXECUTOR_RATE', 1)),
+    burst=int(os.environ.get('CODE_EXECUTOR_BURST', 5))
+)
+
+def admission_key(identity):
+    """Key that admission limits are counted against"""
+    if 'user_id' in identity:
+        return f"user:{identity['user_id']}"
+    return f"session:{identity['session_id']}"
+
+def rejected_response(rejection):
+    """HTTP 429 telling the client when to retry"""
+    return jsonify({
+        'success': False,
+        'error': str(rejection),
+        'retry_after': rejection.retry_after
+    }), 429, {'Retry-After': str(rejection.retry_after)}
+
 @app.route('/execute-code', methods=['POST'])
 def execute_code_route():
-    """Execute submitted code and return results"""
+    """Execute submitted code and return results
+
+    With "async": true the submission is queued and a job id is returned
+    immediately; poll /execute-code/jobs/<job_id> for the result.  With
+    "profile": true the result also carries a cProfile/tracemalloc report.
+    """
     try:
         data = request.json
         language = data.get('language', 'python')
         code = data.get('code', '')
+        profile = bool(data.get('profile'))
         
         if not code.strip():
             return jsonify({
@@ -305,44 +401,317 @@ def execute_code_route():
                 'error': 'No code provided'
             })
         
-        result = execute_code(code, language)
+        identity = current_identity()
+        try:
+            ticket = execution_admission.admit(admission_key(identity))
+        except Rejected as rejection:
+            return rejected_response(rejection)
+
+        if data.get('async'):
+            def job():
+                with app.app_context():
+                    return ticket.run(lambda: run_and_store_submission(identity, language, code, profile))
+
+            try:
+                queued = execution_queue.submit(job, owner=identity)
+            except QueueFull:
+                ticket.release()
+                return jsonify({
+                    'success': False,
+                    'error': 'Too many submissions are waiting, please try again shortly'
+                }), 503
+
+            return jsonify({'success': True, **queued.to_dict()}), 202
+
+        return jsonify(ticket.run(lambda: run_and_store_submission(identity, language, code, profile)))
         
-        # Store submission
-        if current_user.is_authenticated:
-            submission = CodeSubmission(
-                user_id=current_user.id,
-                language=language,
-                code=code,
-                output=result.get('output', ''),
-                error=result.get('error', ''),
-                execution_time=result.get('execution_time', 0)
-            )
-        else:
-            submission = CodeSubmission(
-                session_id=session['session_id'],
-                language=language,
-                code=code,
-                output=result.get('output', ''),
-                error=result.get('error', ''),
-                execution_time=result.get('execution_time', 0)
-            )
-        db.session.add(submission)
+    except Exception as e:
+        logging.error(f"Code execution error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        })
+
+@app.route('/execute-code/stream', methods=['POST'])
+def execute_code_stream():
+    """Execute submitted code, streaming its output as Server-Sent Events
+
+    Emits "output" events ({"stream": "stdout"|"stderr", "data": ...}) while
+    the program runs and one final "result" event with the usual fields.
+    """
+    data = request.get_json(silent=True) or {}
+    language = data.get('language', 'python')
+    code = data.get('code', '')
+
+    if not code.strip():
+        return jsonify({
+            'success': False,
+            'error': 'No code provided'
+        })
+
+    identity = current_identity()
+    try:
+        ticket = execution_admission.admit(admission_key(identity))
+    except Rejected as rejection:
+        return rejected_response(rejection)
+
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def events():
+        try:
+            with ticket:
+                for message in stream_code(code, language):
+                    if message['event'] == 'chunk':
+                        yield sse('output', {'stream': message['stream'], 'data': message['data']})
+                    else:
+                        result = message['result']
+                        store_submission(identity, language, code, result)
+                        yield sse('result', submission_response(result))
+        except Exception as e:
+            logging.error(f"Code streaming error: {str(e)}")
+            yield sse('result', {'success': False, 'error': f'Server error: {str(e)}'})
+
+    response = Response(stream_with_context(events()),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The stream may be dropped before it starts; don't leak the admission
+    response.call_on_close(ticket.release)
+    return response
+
+@app.route('/execute-code/batch', methods=['POST'])
+def execute_code_batch():
+    """Execute several snippets concurrently and return their results in order
+
+    Body: {"snippets": [{"code": ..., "language": "python"}, ...]}; plain
+    strings are accepted as Python snippets.  All snippets share one deadline.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        snippets = data.get('snippets')
+        if not isinstance(snippets, list) or not snippets:
+            return jsonify({'success': False, 'error': 'No snippets provided'}), 400
+        # Each snippet costs one rate-limit token, so a batch cannot exceed the burst
+        max_snippets = min(BATCH_MAX_SNIPPETS, execution_admission.burst)
+        if len(snippets) > max_snippets:
+            return jsonify({
+                'success': False,
+                'error': f'At most {max_snippets} snippets can be run at once'
+            }), 400
+
+        parsed = []
+        for snippet in snippets:
+            if isinstance(snippet, str):
+                snippet = {'code': snippet}
+            if not isinstance(snippet, dict) or not isinstance(snippet.get('code'), str) \
+                    or not snippet['code'].strip():
+                return jsonify({'success': False, 'error': 'Every snippet needs code'}), 400
+            language = snippet.get('language', 'python')
+            if not isinstance(language, str):
+                return jsonify({'success': False, 'error': 'Snippet language must be a string'}), 400
+            parsed.append((snippet['code'], language))
+
+        identity = current_identity()
+        try:
+            ticket = execution_admission.admit(admission_key(identity), cost=len(parsed), slots=len(parsed))
+        except Rejected as rejection:
+            return rejected_response(rejection)
+
+        # Runs no more snippets at a time than the slots the ticket holds
+        results = ticket.run(lambda: execute_batch(parsed, concurrency=ticket.slots))
+
+        # One executemany INSERT for the whole batch
+        db.session.execute(insert(CodeSubmission), [
+            submission_values(identity, language, code, result)
+            for (code, language), result in zip(parsed, results)
+        ])
+        count_activity(code_submissions=len(results))
         db.session.commit()
-        
+
         return jsonify({
-            'success': result['success'],
-            'output': result.get('output', ''),
-            'error': result.get('error', ''),
-            'execution_time': result.get('execution_time', 0)
+            'success': True,
+            'results': [submission_response(result) for result in results]
         })
-        
+
     except Exception as e:
-        logging.error(f"Code execution error: {str(e)}")
+        logging.error(f"Batch execution error: {str(e)}")
         return jsonify({
             'success': False,
             'error': f'Server error: {str(e)}'
         })
 
+@app.route('/execute-code/trace', methods=['POST'])
+def execute_code_trace():
+    """Execute code recording its variables at every line
+
+    Returns the usual execution fields plus trace: {"frames": [...],
+    "frame_count", "truncated"}, delta-encoded frames that
+    static/js/trace_player.js replays.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        code = data.get('code', '')
+        if not code.strip():
+            return jsonify({
+                'success': False,
+                'error': 'No code provided'
+            })
+
+        identity = current_identity()
+        try:
+            ticket = execution_admission.admit(admission_key(identity))
+        except Rejected as rejection:
+            return rejected_response(rejection)
+
+        result = ticket.run(lambda: trace_code(code))
+        store_submission(identity, 'python', code, result)
+
+        return jsonify({**submission_response(result), 'trace': result.get('trace')})
+
+    except Exception as e:
+        logging.error(f"Code tracing error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        })
+
+@app.route('/execute-code/complexity', methods=['POST'])
+def execute_code_complexity():
+    """Measure how a function's running time and memory grow with input size
+
+    Body: {"code": ..., "function": name, "input": "list"|"sorted_list"|"int"|
+    "string", "setup": optional name of a function building the argument(s)
+    for size n, "sizes": optional list of sizes}.  Returns the measured
+    series and the best fitting O(...) curve for time and memory.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        code = data.get('code', '')
+        function = data.get('function')
+        if not code.strip():
+            return jsonify({
+                'success': False,
+                'error': 'No code provided'
+            })
+        if not isinstance(function, str) or not function.isidentifier():
+            return jsonify({'success': False, 'error': 'Name the function to measure'}), 400
+        setup = data.get('setup')
+        if setup is not None and (not isinstance(setup, str) or not setup.isidentifier()):
+            return jsonify({'success': False, 'error': 'setup must be a function name'}), 400
+
+        identity = current_identity()
+        try:
+            # Sizes run in parallel children, one admission slot each
+            ticket = execution_admission.admit(admission_key(identity), slots=COMPLEXITY_PARALLEL)
+        except Rejected as rejection:
+            return rejected_response(rejection)
+
+        result = ticket.run(lambda: measure_complexity(code, function, data.get('input', 'list'),
+                                                       setup, data.get('sizes'), parallel=ticket.slots))
+        store_submission(identity, 'python', code, result)
+
+        return jsonify({
+            **submission_response(result),
+            'series': result.get('series', []),
+            'failed': result.get('failed', []),
+            'skipped': result.get('skipped', []),
+            'time_fit': result.get('time_fit'),
+            'memory_fit': result.get('memory_fit')
+        })
+
+    except Exception as e:
+        logging.error(f"Complexity measurement error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        })
+
+@app.route('/exercises')
+def exercises():
+    """Coding exercises available for grading"""
+    return jsonify({
+        'exercises': [{
+            'id': exercise_id,
+            'title': exercise['title'],
+            'topic': exercise['topic'],
+            'description': exercise['description'],
+            'starter_code': exercise['starter_code'],
+            'test_count': len(exercise['test_cases'])
+        } for exercise_id, exercise in EXERCISES.items()]
+    })
+
+@app.route('/exercises/<exercise_id>/grade', methods=['POST'])
+def grade_exercise(exercise_id):
+    """Grade submitted code against an exercise's test cases
+
+    Returns the usual execution fields plus tests_passed, tests_total and a
+    per-case list of pass/fail, timing and (for visible cases) the values.
+    """
+    exercise = EXERCISES.get(exercise_id)
+    if exercise is None:
+        return jsonify({'success': False, 'error': 'Unknown exercise'}), 404
+
+    try:
+        data = request.get_json(silent=True) or {}
+        code = data.get('code', '')
+        if not code.strip():
+            return jsonify({
+                'success': False,
+                'error': 'No code provided'
+            })
+
+        identity = current_identity()
+        try:
+            # Cases run in parallel children, one admission slot each
+            ticket = execution_admission.admit(admission_key(identity), slots=PARALLEL_CASES)
+        except Rejected as rejection:
+            return rejected_response(rejection)
+
+        result = ticket.run(lambda: grade_submission(code, exercise_id, exercise, parallel=ticket.slots))
+        store_submission(identity, 'python', code, result)
+
+        return jsonify({
+            **submission_response(result),
+            'exercise_id': exercise_id,
+            'tests_passed': result['tests_passed'],
+            'tests_total': result['tests_total'],
+            'cases': result['cases']
+        })
+
+    except Exception as e:
+        logging.error(f"Grading error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        })
+
+@app.route('/execute-code/jobs/<job_id>')
+def execution_job_status(job_id):
+    """Poll a queued execution; ?wait=N holds the request up to N seconds
+
+    The wait is capped at JOB_POLL_MAX_WAIT so that polling clients cannot
+    tie up the request threads the queue exists to keep free.
+    """
+    wait = min(max(request.args.get('wait', 0, type=float), 0), JOB_POLL_MAX_WAIT)
+    job = execution_queue.wait(job_id, current_identity(), wait)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+
+    return jsonify({'success': True, **job.to_dict()})
+
+@app.route('/execute-code/stats')
+@login_required
+def execution_stats():
+    """Executor load for monitoring: admission queue depth, job queue and cache"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    return jsonify({
+        'admission': execution_admission.stats(),
+        'job_queue_depth': execution_queue.depth(),
+        'cache': result_cache.stats()
+    })
+
 @app.route('/visualizer')
 @app.route('/visualizer/<data_structure>')
 def visualizer(data_structure=None):
@@ -378,91 +747,26 @@ def submit_quiz():
         quiz_id = data.get('quiz_id')
         answers = data.get('answers', {})
         
-        if quiz_id not in QUIZ_DATA:
+        quiz_key = QUIZ_INDEX.get(quiz_id)
+        if quiz_key is None:
             return jsonify({'success': False, 'error': 'Invalid quiz'})
         
-        quiz = QUIZ_DATA[quiz_id]
-        total_questions = len(quiz['questions'])
-        correct_answers = 0
-        results = {}
+        score, points_earned, correct_answers, results = grade_quiz(quiz_key, answers)
+        identity = current_identity()
         
-        for question_id, user_answer in answers.items():
-            question = next((q for q in quiz['questions'] if q['id'] == question_id), None)
-            if not question:
-                continue
-            
-            is_correct = user_answer == question['correct_answer']
-            if is_correct:
-                correct_answers += 1
-            
-            results[question_id] = {
-                'correct': is_correct,
-                'user_answer': user_answer,
-                'correct_answer': question['correct_answer'],
-                'explanation': question.get('explanation', '')
-            }
-            
-            # Store attempt
-            if current_user.is_authenticated:
-                attempt = QuizAttempt(
-                    user_id=current_user.id,
-                    quiz_id=quiz_id,
-                    question_id=question_id,
-                    user_answer=user_answer,
-                    correct=is_correct
-                )
-            else:
-                attempt = QuizAttempt(
-                    session_id=session['session_id'],
-                    quiz_id=quiz_id,
-                    question_id=question_id,
-                    user_answer=user_answer,
-                    correct=is_correct
-                )
-            db.session.add(attempt)
-        
-        score = int((correct_answers / total_questions) * 100)
+        # One executemany INSERT for all the answers
+        if results:
+            db.session.execute(insert(QuizAttempt), [dict(
+                **identity,
+                quiz_id=quiz_id,
+                question_id=question_id,
+                user_answer=result['user_answer'],
+                correct=result['correct']
+            ) for question_id, result in results.items()])
+            count_activity(quiz_attempts=len(results))
         
         # Update progress
-        if current_user.is_authenticated:
-            progress = UserProgress.query.filter_by(
-                user_id=current_user.id,
-                module_name='quiz',
-                section_name=quiz_id
-            ).first()
-            
-            if not progress:
-                progress = UserProgress(
-                    user_id=current_user.id,
-                    module_name='quiz',
-                    section_name=quiz_id,
-                    completed=True,
-                    score=score
-                )
-                db.session.add(progress)
-            else:
-                progress.score = max(progress.score, score)
-                progress.completed = True
-        else:
-            # For anonymous users
-            progress = UserProgress.query.filter_by(
-                session_id=session['session_id'],
-                module_name='quiz',
-                section_name=quiz_id
-            ).first()
-            
-            if not progress:
-                progress = UserProgress(
-                    session_id=session['session_id'],
-                    module_name='quiz',
-                    section_name=quiz_id,
-                    completed=True,
-                    score=score
-                )
-                db.session.add(progress)
-            else:
-                progress.score = max(progress.score, score)
-                progress.completed = True
+        record_progress(identity, 'quiz', quiz_id, score)
         
         db.session.commit()
         
@@ -470,7 +774,9 @@ def submit_quiz():
             'success': True,
             'score': score,
             'correct_answers': correct_answers,
-            'total_questions': total_questions,
+            'total_questions': len(quiz_key.questions),
+            'points_earned': points_earned,
+            'total_points': quiz_key.total_points,
             'results': results
         })
         
@@ -481,10 +787,8 @@ def submit_quiz():
 @app.route('/progress')
 def get_progress():
     """Get user progress data"""
-    if current_user.is_authenticated:
-        progress = UserProgress.query.filter_by(user_id=current_user.id).all()
-    else:
-        progress = UserProgress.query.filter_by(session_id=session['session_id']).all()
+    identity = current_identity()
+    progress = UserProgress.query.filter_by(**identity).all()
     
     progress_data = {}
     
@@ -495,6 +799,11 @@ def get_progress():
             'completed': p.completed,
             'score': p.score
         }
+    # Views still waiting in the write-behind buffer
+    for p in progress_buffer.pending_for(identity):
+        section = progress_data.setdefault(p['module_name'], {}).setdefault(p['section_name'], {'score': 0})
+        section['completed'] = True
+        section['score'] = max(section['score'] or 0, p['score'])
     # Add meta totals to ensure 100% only when all theory and quizzes are completed
     try:
         theory_total = len(THEORY_CONTENT.keys())
@@ -521,6 +830,15 @@ def get_progress():
 
     return jsonify(progress_data)
 
+@app.route('/progress/stats')
+@login_required
+def progress_stats():
+    """Write-behind buffer depth and flush batch sizes, for monitoring"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    return jsonify(progress_buffer.stats())
+
 @app.route('/chatbot', methods=['POST'])
 def chatbot():
     """Proxy user message to an external AI API and return its reply.
@@ -0,0 +1,838 @@
+"""
+Warm sandbox worker for the code executor.
+
+code_executor.WorkerPool starts this script once per worker and then feeds it
+submissions over a line-delimited JSON protocol on stdin/stdout.  Every
+submission runs in a freshly forked child, so user code never sees state left
+behind by a previous run while the interpreter start-up cost is paid only once
+per worker.
+"""
+
+import builtins
+import codecs
+import collections
+import contextlib
+import copy
+import cProfile
+import functools
+import inspect
+import itertools
+import json
+import linecache
+import math
+import os
+import random
+import reprlib
+import resource
+import select
+import selectors
+import signal
+import string
+import sys
+import time
+import tracemalloc
+import traceback
+import types
+
+SOURCE_NAME = 'main.py'
+READ_CHUNK = 65536
+MEMORY_ERROR_EXIT = 120  # child exit status reporting an exhausted address space
+REPORT_MAX_BYTES = 4 * 1024 * 1024  # cap on a harness report
+
+# Returned values are shown to the student abbreviated
+value_repr = reprlib.Repr()
+value_repr.maxlist = value_repr.maxtuple = value_repr.maxset = value_repr.maxdict = 20
+value_repr.maxstring = value_repr.maxother = 200
+
+current_child = None
+
+
+def terminate(signum, frame):
+    """Take the running submission down with the worker"""
+    if current_child is not None:
+        try:
+            os.killpg(current_child, signal.SIGKILL)
+        except OSError:
+            pass
+    os._exit(1)
+
+
+def lower_limit(limit, soft, hard):
+    """Apply an rlimit without trying to raise the inherited hard limit"""
+    _, current_hard = resource.getrlimit(limit)
+    if current_hard != resource.RLIM_INFINITY:
+        soft = min(soft, current_hard)
+        hard = min(hard, current_hard)
+    resource.setrlimit(limit, (soft, hard))
+
+
+def apply_limits(limits):
+    """Restrict CPU time, address space and process count of the child"""
+    if limits.get('cpu_seconds'):
+        # SIGXCPU at the soft limit, SIGKILL one second later
+        cpu = int(limits['cpu_seconds'])
+        lower_limit(resource.RLIMIT_CPU, cpu, cpu + 1)
+    if limits.get('memory_bytes'):
+        lower_limit(resource.RLIMIT_AS, limits['memory_bytes'], limits['memory_bytes'])
+    if limits.get('processes') is not None:
+        lower_limit(resource.RLIMIT_NPROC, limits['processes'], limits['processes'])
+
+
+def write_all(fd, data):
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def run_case(function, case):
+    """Call the submitted function on one test case's arguments"""
+    start_time = time.perf_counter()
+    try:
+        actual = function(*case['args'])
+    except BaseException as e:
+        return {
+            'passed': False,
+            'error': ''.join(traceback.format_exception_only(type(e), e)).strip(),
+            'elapsed': time.perf_counter() - start_time
+        }
+    elapsed = time.perf_counter() - start_time
+
+    try:
+        # Expected values arrive as JSON, so compare tuples as lists and so on
+        actual = json.loads(json.dumps(actual))
+    except (TypeError, ValueError, RecursionError):
+        pass
+    try:
+        passed = bool(actual == case['expected'])
+    except BaseException:
+        passed = False
+    return {'passed': passed, 'actual': value_repr.repr(actual), 'elapsed': elapsed}
+
+
+def fork_call(call, limits):
+    """Fork a child from the loaded submission that reports call() as JSON"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            if limits.get('processes') is not None:
+                lower_limit(resource.RLIMIT_NPROC, limits['processes'], limits['processes'])
+            # Output printed by the code under test is not part of the result
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, 1)
+            os.dup2(devnull, 2)
+            write_all(write_fd, json.dumps(call()).encode('utf-8'))
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    return read_fd, pid
+
+
+def call_failure(status):
+    """Result for a forked call whose child died without reporting"""
+    returncode = os.waitstatus_to_exitcode(status)
+    if returncode == -signal.SIGXCPU:
+        error = 'CPU time limit exceeded'
+    elif returncode == MEMORY_ERROR_EXIT:
+        error = 'Memory limit exceeded'
+    else:
+        error = f'Crashed (exit status {returncode})'
+    return {'error': error}
+
+
+def run_forked(calls, parallel, limits, timeout=None, deadline=None, stop_on_timeout=False):
+    """Run each zero-argument call in its own child forked from this process
+
+    At most parallel children run at once.  A child is killed once it has
+    run for timeout seconds or the perf_counter() deadline passes; with
+    stop_on_timeout no further calls are started after that.  Returns one
+    result dict per call, or None for calls that were never started.
+    """
+    results = [None] * len(calls)
+    running = {}  # read end of a child's pipe -> [index, pid, start time, chunks]
+    next_call = 0
+    stopped = False
+
+    while running or (next_call < len(calls) and not stopped):
+        while next_call < len(calls) and not stopped and len(running) < parallel:
+            fd, pid = fork_call(calls[next_call], limits)
+            running[fd] = [next_call, pid, time.perf_counter(), []]
+            next_call += 1
+
+        expiries = [entry[2] + timeout for entry in running.values()] if timeout else []
+        if deadline is not None:
+            expiries.append(deadline)
+        wait = max(min(expiries) - time.perf_counter(), 0) if expiries else None
+        ready, _, _ = select.select(list(running), [], [], wait)
+        for fd in ready:
+            data = os.read(fd, READ_CHUNK)
+            if data:
+                running[fd][3].append(data)
+                continue
+            index, pid, _, chunks = running.pop(fd)
+            os.close(fd)
+            _, status = os.waitpid(pid, 0)
+            try:
+                results[index] = json.loads(b''.join(chunks))
+            except ValueError:
+                results[index] = call_failure(status)
+
+        now = time.perf_counter()
+        for fd, (index, pid, started, _) in list(running.items()):
+            if deadline is not None and now >= deadline:
+                error = 'Time budget exhausted'
+            elif timeout and now - started >= timeout:
+                error = f'Timed out after {timeout} seconds'
+            else:
+                continue
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            os.close(fd)
+            del running[fd]
+            results[index] = {'error': error, 'timed_out': True, 'elapsed': now - started}
+            stopped = stop_on_timeout
+
+    return results
+
+
+def grade_cases(namespace, harness, limits):
+    """Run every test case against the loaded submission
+
+    Each case runs in its own child forked from this already-loaded process,
+    up to harness['parallel'] at a time, and is killed after
+    harness['case_timeout'] seconds.
+    """
+    name = harness['function']
+    function = namespace.get(name)
+    if not callable(function):
+        return {'error': f'Function {name}() is not defined'}
+
+    calls = [functools.partial(run_case, function, case) for case in harness['cases']]
+    results = run_forked(calls, max(1, harness.get('parallel', 1)), limits,
+                         timeout=harness['case_timeout'])
+    for result in results:
+        result.setdefault('passed', False)
+    return {'cases': results}
+
+
+def generated_input(kind, n):
+    """Argument of size n for the built-in input kinds (same data every run)"""
+    rng = random.Random(n)
+    if kind == 'int':
+        return n
+    if kind == 'list':
+        return [rng.randrange(n * 10 + 1) for _ in range(n)]
+    if kind == 'sorted_list':
+        return list(range(n))
+    if kind == 'string':
+        return ''.join(rng.choice(string.ascii_lowercase) for _ in range(n))
+    raise ValueError(f'Unknown input kind {kind!r}')
+
+
+def measure_size(function, make_args, n, min_time, max_repeats):
+    """Time function on an input of size n, then trace its extra memory
+
+    The call is repeated on fresh copies of the input until min_time seconds
+    of calls have accumulated, max_repeats is reached or copying the input
+    has taken most of 4 * min_time, and the fastest call is kept.
+    """
+    try:
+        args = make_args(n)
+        best = None
+        total = 0.0
+        repeats = 0
+        started = time.perf_counter()
+        while (total < min_time and repeats < max_repeats
+               and time.perf_counter() - started < 4 * min_time):
+            fresh = [copy.copy(arg) for arg in args]
+            start_time = time.perf_counter()
+            function(*fresh)
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+            total += elapsed
+            repeats += 1
+
+        fresh = [copy.copy(arg) for arg in args]
+        tracemalloc.start()
+        function(*fresh)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    except BaseException as e:
+        return {'error': ''.join(traceback.format_exception_only(type(e), e)).strip()}
+
+    return {'time': best, 'mean_time': total / repeats, 'repeats': repeats, 'memory_peak_bytes': peak}
+
+
+def measure_complexity(namespace, harness, limits):
+    """Time the submitted function at each of harness['sizes']
+
+    Each size is measured in its own child forked from the loaded submission,
+    up to harness['parallel'] at a time, smallest first.  Sizes still running
+    when harness['budget'] seconds have passed are abandoned along with all
+    larger ones.
+    """
+    name = harness['function']
+    function = namespace.get(name)
+    if not callable(function):
+        return {'error': f'Function {name}() is not defined'}
+
+    setup_name = harness.get('setup')
+    if setup_name:
+        setup = namespace.get(setup_name)
+        if not callable(setup):
+            return {'error': f'Function {setup_name}() is not defined'}
+
+        def make_args(n):
+            # A tuple from setup(n) is unpacked into several arguments
+            args = setup(n)
+            return list(args) if isinstance(args, tuple) else [args]
+    else:
+        generated_input(harness['input'], 0)  # reject unknown kinds up front
+
+        def make_args(n):
+            return [generated_input(harness['input'], n)]
+
+    sizes = harness['sizes']
+    calls = [functools.partial(measure_size, function, make_args, n,
+                               harness.get('min_time', 0.05), harness.get('max_repeats', 100000))
+             for n in sizes]
+    results = run_forked(calls, max(1, harness.get('parallel', 1)), limits,
+                         deadline=time.perf_counter() + harness['budget'], stop_on_timeout=True)
+    return {'sizes': [{'n': n, **result} for n, result in zip(sizes, results) if result is not None]}
+
+
+def profile_entry(key, entry):
+    """One row of the profile table"""
+    filename, line, name = key
+    primitive_calls, calls, self_time, total_time, _ = entry
+    if filename != '~':
+        name = f'{name} ({os.path.basename(filename)}:{line})'
+    return {
+        'function': name,
+        'calls': calls,
+        'primitive_calls': primitive_calls,
+        'self_time': self_time,
+        'total_time': total_time
+    }
+
+
+class Profiled:
+    """Run the submission under cProfile and tracemalloc
+
+    Once the submission has finished, the report holds the top
+    harness['top'] functions by own time, the busiest allocation sites in
+    the submission and the traced memory totals.
+    """
+
+    def __init__(self, harness, limits, emit):
+        self.top = harness.get('top', 15)
+        self.emit = emit
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        tracemalloc.start()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        self.profiler.create_stats()
+        entries = [profile_entry(key, entry) for key, entry in self.profiler.stats.items()
+                   if key[0] != __file__ and key[2] not in PROFILER_CALLS]
+        entries.sort(key=lambda row: row['self_time'], reverse=True)
+
+        statistics = snapshot.statistics('lineno')
+        sites = snapshot.filter_traces([tracemalloc.Filter(True, SOURCE_NAME)]).statistics('lineno')
+        self.emit(dict(
+            functions=entries[:self.top],
+            function_count=len(entries),
+            memory_current_bytes=current,
+            memory_peak_bytes=peak,
+            allocated_blocks=sum(stat.count for stat in statistics),
+            allocation_sites=[{
+                'line': stat.traceback[0].lineno,
+                'size_bytes': stat.size,
+                'blocks': stat.count
+            } for stat in sites[:self.top]]
+        ))
+        return False
+
+
+class CountingWriter:
+    """Stand-in for sys.stdout that counts the characters written through it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.written = 0
+
+    def write(self, text):
+        self.written += len(text)
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class Tracer:
+    """Record the submission's variables at every line as replayable frames
+
+    Variables of each active frame of the submission are captured after the
+    fashion of Python Tutor: numbers, strings and None inline, and lists,
+    tuples, dicts, sets and instances of the submission's own classes as
+    heap objects referenced by number, so aliasing and linked structures are
+    preserved.  Each frame only holds what changed since the one before:
+
+        {"line", "event", "depth", "out",
+         "frames": [{"index", "function"?, "new"?, "set"?, "del"?}],
+         "heap": {ref: object}, "heap_del": [ref]}
+
+    Tracing stops once harness['max_frames'] frames or harness['max_bytes']
+    bytes of frames have been recorded.  The report is sent right away then,
+    so it survives the program running on into a time or CPU limit.
+    """
+
+    def __init__(self, harness, limits, emit):
+        self.max_frames = harness.get('max_frames', 1000)
+        self.max_bytes = harness.get('max_bytes', 2 * 1024 * 1024)
+        self.max_items = harness.get('max_items', 50)
+        self.max_objects = harness.get('max_objects', 200)
+        self.frames = []
+        self.size = 0
+        self.truncated = False
+        self.emit = emit
+        self.refs = {}  # id(obj) -> (ref, obj); keeping obj alive keeps its id unique
+        self.previous_stack = []  # [(frame id, function, {name: encoded JSON})]
+        self.previous_heap = {}  # ref -> encoded JSON
+        self.stdout = None
+
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = CountingWriter(self.stdout)
+        sys.settrace(self.trace_call)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.settrace(None)
+        sys.stdout = self.stdout
+        self.send_report()
+        return False
+
+    def send_report(self):
+        self.emit({'frames': self.frames, 'frame_count': len(self.frames), 'truncated': self.truncated})
+
+    @staticmethod
+    def is_traced(frame):
+        """Frames of the submission, except class bodies"""
+        code = frame.f_code
+        return code.co_filename == SOURCE_NAME and (
+            code.co_flags & inspect.CO_OPTIMIZED or code.co_name == '<module>')
+
+    def trace_call(self, frame, event, arg):
+        if self.truncated or not self.is_traced(frame):
+            return None
+        return self.trace_line
+
+    def trace_line(self, frame, event, arg):
+        if self.truncated:
+            return None
+        if event in ('line', 'return', 'exception'):
+            self.record(frame, event, arg)
+        return self.trace_line
+
+    def reference(self, value):
+        entry = self.refs.get(id(value))
+        if entry is None:
+            entry = self.refs[id(value)] = (len(self.refs) + 1, value)
+        return entry[0]
+
+    def encode(self, value, pending):
+        """JSON for a variable's value; containers and objects become references"""
+        if value is None or isinstance(value, (bool, str)):
+            if isinstance(value, str) and len(value) > value_repr.maxstring:
+                return value[:value_repr.maxstring] + '...'
+            return value
+        if isinstance(value, int):
+            # Beyond 2**53 JavaScript numbers lose precision
+            return value if abs(value) < 2 ** 53 else {'repr': value_repr.repr(value)}
+        if isinstance(value, float):
+            return value if math.isfinite(value) else {'repr': repr(value)}
+        own_class = type(value).__module__ == '__main__'
+        if (own_class and hasattr(value, '__dict__')) or (
+                not own_class and isinstance(value, (list, tuple, dict, set, frozenset, collections.deque))):
+            ref = self.reference(value)
+            pending.append((ref, value))
+            return {'ref': ref}
+        if own_class:
+            return {'repr': f'<{type(value).__name__} object>'}
+        return {'repr': value_repr.repr(value)}
+
+    def heap_object(self, value, pending):
+        items = self.max_items
+        if isinstance(value, dict):
+            return {
+                'type': type(value).__name__,
+                'length': len(value),
+                'entries': [[self.encode(key, pending), self.encode(item, pending)]
+                            for key, item in itertools.islice(value.items(), items)]
+            }
+        if isinstance(value, (list, tuple, set, frozenset, collections.deque)):
+            return {
+                'type': type(value).__name__,
+                'length': len(value),
+                'items': [self.encode(item, pending) for item in itertools.islice(value, items)]
+            }
+        return {
+            'type': 'object',
+            'class': type(value).__name__,
+            'fields': {name: self.encode(field, pending)
+                       for name, field in itertools.islice(vars(value).items(), items)}
+        }
+
+    def frame_variables(self, frame, pending):
+        # Functions, classes and modules are left out; they don't change
+        variables = {name: value for name, value in frame.f_locals.items()
+                     if not name.startswith('__') and not isinstance(value, HIDDEN_TYPES)}
+        return {name: json.dumps(self.encode(value, pending))
+                for name, value in itertools.islice(variables.items(), self.max_items)}
+
+    def record(self, frame, event, arg):
+        frames = []
+        current = frame
+        while current is not None:
+            if self.is_traced(current):
+                frames.append(current)
+            current = current.f_back
+        frames.reverse()
+
+        pending = collections.deque()
+        stack = []
+        for active in frames:
+            variables = self.frame_variables(active, pending)
+            if active is frame and event == 'return':
+                variables['__return__'] = json.dumps(self.encode(arg, pending))
+            stack.append((id(active), active.f_code.co_name, variables))
+
+        heap = {}
+        while pending and len(heap) < self.max_objects:
+            ref, value = pending.popleft()
+            if ref not in heap:
+                heap[ref] = json.dumps(self.heap_object(value, pending))
+
+        delta = {'line': frame.f_lineno, 'event': event, 'depth': len(stack), 'out': sys.stdout.written}
+        if event == 'exception':
+            delta['exception'] = ''.join(traceback.format_exception_only(arg[0], arg[1])).strip()
+
+        changed_frames = []
+        for index, (frame_id, function, variables) in enumerate(stack):
+            previous = self.previous_stack[index] if index < len(self.previous_stack) else None
+            if previous is None or previous[0] != frame_id:
+                changed_frames.append({'index': index, 'function': function, 'new': True,
+                                       'set': {name: json.loads(value) for name, value in variables.items()}})
+                continue
+            updated = {name: json.loads(value) for name, value in variables.items()
+                       if previous[2].get(name) != value}
+            removed = [name for name in previous[2] if name not in variables]
+            if updated or removed:
+                change = {'index': index}
+                if updated:
+                    change['set'] = updated
+                if removed:
+                    change['del'] = removed
+                changed_frames.append(change)
+        if changed_frames:
+            delta['frames'] = changed_frames
+
+        changed_heap = {ref: json.loads(value) for ref, value in heap.items()
+                        if self.previous_heap.get(ref) != value}
+        if changed_heap:
+            delta['heap'] = changed_heap
+        removed_heap = [ref for ref in self.previous_heap if ref not in heap]
+        if removed_heap:
+            delta['heap_del'] = removed_heap
+
+        size = len(json.dumps(delta))
+        if len(self.frames) >= self.max_frames or self.size + size > self.max_bytes:
+            self.truncated = True
+            sys.settrace(None)
+            self.send_report()
+            return
+        self.frames.append(delta)
+        self.size += size
+        self.previous_stack = stack
+        self.previous_heap = heap
+
+
+HIDDEN_TYPES = (types.FunctionType, types.BuiltinFunctionType, types.ModuleType, type)
+
+# Profiler entries for the machinery around the submission
+PROFILER_CALLS = {"<method 'disable' of '_lsprof.Profiler' objects>", '<built-in method builtins.exec>'}
+
+# Harnesses run a loaded submission in a particular way and return a report.
+# Those that fork per call get the process limit applied in their own children.
+HARNESSES = {
+    'grade': grade_cases,
+    'complexity': measure_complexity,
+}
+FORKING_HARNESSES = {'grade', 'complexity'}
+
+# Wrappers are context managers around the execution of the submission
+# itself; they pass their report to the emit function they are given.
+WRAPPERS = {
+    'profile': Profiled,
+    'trace': Tracer,
+}
+
+
+def report_writer(report_w):
+    """Return emit(report), which writes a harness report to report_w once"""
+    written = []
+
+    def emit(report):
+        if not written:
+            written.append(True)
+            write_all(report_w, json.dumps(report).encode('utf-8'))
+    return emit
+
+
+def run_child(code, out_w, err_w, limits, line_buffered=False, harness=None, report_w=None):
+    """Execute a submission inside the forked child and exit
+
+    With a harness, the submission is either run inside
+    WRAPPERS[harness['kind']] or loaded and then handed to
+    HARNESSES[harness['kind']]; the report is written to report_w as JSON.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.setpgid(0, 0)
+    if harness is not None and harness['kind'] in FORKING_HARNESSES:
+        apply_limits({key: value for key, value in limits.items() if key != 'processes'})
+    else:
+        apply_limits(limits)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(out_w, 1)
+    os.dup2(err_w, 2)
+    if line_buffered:
+        # Streaming clients should see each line as soon as it is printed
+        sys.stdout.reconfigure(line_buffering=True)
+
+    sys.argv = [SOURCE_NAME]
+    linecache.cache[SOURCE_NAME] = (len(code), None, code.splitlines(True), SOURCE_NAME)
+    exit_code = 0
+
+    try:
+        compiled = compile(code, SOURCE_NAME, 'exec')
+    except SyntaxError as e:
+        # CPython re-reads SyntaxError.text from a file named SOURCE_NAME on disk
+        lines = code.splitlines()
+        if e.lineno and 0 < e.lineno <= len(lines):
+            e.text = lines[e.lineno - 1] + '\n'
+        traceback.print_exception(type(e), e, None)
+        exit_code = 1
+    else:
+        namespace = {'__name__': '__main__', '__file__': SOURCE_NAME, '__builtins__': builtins}
+        wrapper = WRAPPERS.get(harness['kind']) if harness is not None else None
+        emit = report_writer(report_w) if harness is not None else None
+        loaded = False
+        try:
+            with wrapper(harness, limits, emit) if wrapper else contextlib.nullcontext():
+                exec(compiled, namespace)
+            loaded = True
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except MemoryError as e:
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            exit_code = MEMORY_ERROR_EXIT
+        except BaseException as e:
+            # Drop this frame so the traceback starts at the user's code
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            exit_code = 1
+
+        if loaded and harness is not None and not wrapper:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            try:
+                emit(HARNESSES[harness['kind']](namespace, harness, limits))
+            except Exception as e:
+                emit({'error': ''.join(traceback.format_exception_only(type(e), e)).strip()})
+
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(exit_code)
+
+
+def kill_reason(returncode, timed_out, output_truncated):
+    """Name the limit that stopped the child, or None if it ended on its own"""
+    if timed_out:
+        return 'timeout'
+    if output_truncated:
+        return 'output_limit'
+    if returncode == -signal.SIGXCPU:
+        return 'cpu_limit'
+    if returncode == MEMORY_ERROR_EXIT:
+        return 'memory_limit'
+    if returncode < 0:
+        return 'signal'
+    return None
+
+
+def run_submission(code, timeout, max_output=None, limits=None, on_chunk=None, harness=None):
+    """Fork a child for one submission and collect its output and usage
+
+    max_output caps the combined stdout/stderr bytes; the child is killed
+    once it is exceeded.  limits holds the rlimits applied to the child.
+    on_chunk(stream, text) is called as output arrives.  harness selects a
+    way of running the loaded submission (see HARNESSES); its report is
+    returned as harness_result.
+    """
+    global current_child
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    report_r, report_w = os.pipe() if harness is not None else (None, None)
+    pipes = [fd for fd in (out_r, out_w, err_r, err_w, report_r, report_w) if fd is not None]
+    start_time = time.perf_counter()
+
+    try:
+        pid = os.fork()
+    except OSError:
+        for fd in pipes:
+            os.close(fd)
+        raise
+    if pid == 0:
+        try:
+            os.close(out_r)
+            os.close(err_r)
+            if report_r is not None:
+                os.close(report_r)
+            run_child(code, out_w, err_w, limits or {}, line_buffered=on_chunk is not None,
+                      harness=harness, report_w=report_w)
+        finally:
+            os._exit(70)
+
+    current_child = pid
+    try:
+        os.setpgid(pid, pid)
+    except OSError:
+        pass
+    os.close(out_w)
+    os.close(err_w)
+
+    names = {out_r: 'stdout', err_r: 'stderr'}
+    chunks = {out_r: [], err_r: []}
+    decoders = {fd: codecs.getincrementaldecoder('utf-8')(errors='replace') for fd in names}
+    selector = selectors.DefaultSelector()
+    selector.register(out_r, selectors.EVENT_READ)
+    selector.register(err_r, selectors.EVENT_READ)
+    report_chunks = []
+    report_bytes = 0
+    if report_r is not None:
+        os.close(report_w)
+        selector.register(report_r, selectors.EVENT_READ)
+    deadline = start_time + timeout
+    output_bytes = 0
+    timed_out = False
+    output_truncated = False
+
+    while selector.get_map():
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in selector.select(remaining):
+            data = os.read(key.fd, READ_CHUNK)
+            if not data:
+                selector.unregister(key.fd)
+                continue
+            if key.fd == report_r:
+                # Not program output; an oversized report is dropped entirely
+                report_bytes += len(data)
+                if report_bytes <= REPORT_MAX_BYTES:
+                    report_chunks.append(data)
+                continue
+            if max_output is not None and output_bytes + len(data) > max_output:
+                data = data[:max_output - output_bytes]
+                output_truncated = True
+            output_bytes += len(data)
+            chunks[key.fd].append(data)
+            if on_chunk is not None and data:
+                text = decoders[key.fd].decode(data)
+                if text:
+                    on_chunk(names[key.fd], text)
+            if output_truncated:
+                break
+        if output_truncated:
+            break
+
+    if timed_out or output_truncated:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    selector.close()
+    os.close(out_r)
+    os.close(err_r)
+    if report_r is not None:
+        os.close(report_r)
+    _, status, usage = os.wait4(pid, 0)
+    current_child = None
+    elapsed = time.perf_counter() - start_time
+    returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is reported in kilobytes on Linux but in bytes on macOS
+    peak_rss_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+
+    result = {
+        'event': 'result',
+        'returncode': returncode,
+        'stdout': b''.join(chunks[out_r]).decode('utf-8', errors='replace'),
+        'stderr': b''.join(chunks[err_r]).decode('utf-8', errors='replace'),
+        'kill_reason': kill_reason(returncode, timed_out, output_truncated),
+        'elapsed': elapsed,
+        'peak_rss_kb': peak_rss_kb,
+        'cpu_user_time': usage.ru_utime,
+        'cpu_system_time': usage.ru_stime
+    }
+    if harness is not None:
+        try:
+            result['harness_result'] = json.loads(b''.join(report_chunks))
+        except ValueError:
+            result['harness_result'] = None
+    return result
+
+
+def send(message):
+    sys.stdout.write(json.dumps(message) + '\n')
+    sys.stdout.flush()
+
+
+def serve():
+    """Answer one request per input line until stdin is closed
+
+    Streaming requests get {"event": "chunk", ...} lines as output arrives,
+    followed by the usual {"event": "result", ...} report.
+    """
+    for line in sys.stdin:
+        request = json.loads(line)
+        on_chunk = None
+        if request.get('stream'):
+            def on_chunk(stream, text):
+                send({'event': 'chunk', 'stream': stream, 'data': text})
+        send(run_submission(request['code'], request['timeout'],
+                            request.get('max_output'), request.get('limits'), on_chunk,
+                            request.get('harness')))
+
+
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, terminate)
+    serve()
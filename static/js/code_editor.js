@@ -79,6 +79,12 @@ function setupCodeEditorEventListeners() {
         runButton.addEventListener('click', runCode);
     }
     
+    // Trace code button
+    const traceButton = document.getElementById('trace-code');
+    if (traceButton) {
+        traceButton.addEventListener('click', traceCode);
+    }
+    
     // Clear code button
     const clearButton = document.getElementById('clear-code');
     if (clearButton) {
@@ -142,46 +148,264 @@ function runCode() {
         </div>
     `;
     
-    // Send code to backend for execution
-    fetch('/execute-code', {
+    // Stream output where the browser supports it, otherwise queue the run;
+    // profiled runs report at the end, so they always go through the queue
+    const profile = document.getElementById('profile-code')?.checked || false;
+    const execution = !profile && supportsStreaming() ?
+        streamExecution(code, language) : queueExecution(code, language, profile);
+
+    execution
+    .then(data => {
+        displayExecutionResult(data);
+    })
+    .catch(error => {
+        console.error('Error executing code:', error);
+        displayExecutionResult({
+            success: false,
+            error: 'Network error: Failed to execute code'
+        });
+    })
+    .finally(() => {
+        // Restore button state
+        isExecuting = false;
+        runButton.innerHTML = originalText;
+        runButton.disabled = false;
+    });
+}
+
+/**
+ * Run the code under the tracer and open the step-by-step player
+ */
+function traceCode() {
+    if (isExecuting) {
+        DSLearningPlatform.showToast('Code is already executing...', 'warning');
+        return;
+    }
+    
+    if (!codeEditor) {
+        DSLearningPlatform.showToast('Code editor not initialized', 'danger');
+        return;
+    }
+    
+    const code = codeEditor.getValue();
+    if (!code.trim()) {
+        DSLearningPlatform.showToast('Please enter some code to trace', 'warning');
+        return;
+    }
+    
+    isExecuting = true;
+    
+    const traceButton = document.getElementById('trace-code');
+    const originalText = traceButton.innerHTML;
+    traceButton.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>Tracing...';
+    traceButton.disabled = true;
+    
+    const traceCard = document.getElementById('trace-card');
+    traceCard.classList.add('d-none');
+    document.getElementById('output-container').innerHTML = `
+        <div class="text-info">
+            <i class="fas fa-cog fa-spin me-2"></i>
+            Tracing code...
+        </div>
+    `;
+    
+    fetch('/execute-code/trace', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
         body: JSON.stringify({
             code: code,
-            language: language
+            language: 'python'
         })
     })
     .then(response => response.json())
     .then(data => {
         displayExecutionResult(data);
+        if (data.trace) {
+            traceCard.classList.remove('d-none');
+            initializeTracePlayer(document.getElementById('trace-container'), code, data);
+        }
     })
     .catch(error => {
-        console.error('Error executing code:', error);
+        console.error('Error tracing code:', error);
         displayExecutionResult({
             success: false,
-            error: 'Network error: Failed to execute code'
+            error: 'Network error: Failed to trace code'
         });
     })
     .finally(() => {
-        // Restore button state
         isExecuting = false;
-        runButton.innerHTML = originalText;
-        runButton.disabled = false;
+        traceButton.innerHTML = originalText;
+        traceButton.disabled = false;
+    });
+}
+
+/**
+ * Whether fetch responses can be read incrementally in this browser
+ */
+function supportsStreaming() {
+    return typeof ReadableStream !== 'undefined' && typeof TextDecoder !== 'undefined' &&
+        'body' in Response.prototype;
+}
+
+/**
+ * Run code through the streaming endpoint, rendering output as it arrives.
+ * Resolves with the execution result.
+ */
+function streamExecution(code, language) {
+    return fetch('/execute-code/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            code: code,
+            language: language
+        })
+    })
+    .then(response => {
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.startsWith('text/event-stream')) {
+            return response.json();
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let result = null;
+
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                if (done) {
+                    return result || {
+                        success: false,
+                        error: 'Connection closed before execution finished'
+                    };
+                }
+
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const event = parseServerSentEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+
+                    if (event.type === 'output') {
+                        displayExecutionResult({ streaming: true, chunk: event.data });
+                    } else if (event.type === 'result') {
+                        result = event.data;
+                    }
+                }
+                return pump();
+            });
+        }
+
+        return pump();
     });
 }
 
 /**
- * Display code execution results
+ * Parse one Server-Sent Event block into its type and JSON payload
+ */
+function parseServerSentEvent(block) {
+    let type = 'message';
+    const dataLines = [];
+
+    block.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            type = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trimStart());
+        }
+    });
+
+    return { type: type, data: JSON.parse(dataLines.join('\n') || 'null') };
+}
+
+/**
+ * Queue code on the backend, then wait for the job to finish.
+ * Resolves with the execution result.
+ */
+function queueExecution(code, language, profile = false) {
+    return fetch('/execute-code', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            code: code,
+            language: language,
+            async: true,
+            profile: profile
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success || !data.job_id) {
+            return data;
+        }
+        return pollExecutionJob(data.job_id);
+    });
+}
+
+/**
+ * Poll a queued execution job until it finishes.
+ * Each poll waits at most a second on the server; between polls the client
+ * backs off from 250ms to 2s, so a queue of runs does not hold request
+ * threads.  Resolves with the execution result.
+ */
+function pollExecutionJob(jobId, delay = 250) {
+    return fetch(`/execute-code/jobs/${encodeURIComponent(jobId)}?wait=1`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                return data;
+            }
+            if (data.status === 'done') {
+                return data.result;
+            }
+            return new Promise(resolve => setTimeout(resolve, delay))
+                .then(() => pollExecutionJob(jobId, Math.min(delay * 2, 2000)));
+        });
+}
+
+/**
+ * Display code execution results.
+ * Partial results ({streaming: true, chunk}) are appended as they arrive;
+ * the final result replaces them.
  */
 function displayExecutionResult(result) {
     const outputContainer = document.getElementById('output-container');
     
+    if (result.streaming) {
+        let pre = outputContainer.querySelector('pre.streaming-output');
+        if (!pre) {
+            outputContainer.innerHTML = `
+                <div class="text-info d-inline-flex align-items-center mb-1">
+                    <i class="fas fa-cog fa-spin me-2"></i>
+                    <span>Running...</span>
+                </div>
+                <pre class="streaming-output mb-0 mt-1" style="max-height:320px;overflow:auto;"></pre>
+            `;
+            pre = outputContainer.querySelector('pre.streaming-output');
+        }
+
+        const span = document.createElement('span');
+        if (result.chunk.stream === 'stderr') {
+            span.className = 'text-danger';
+        }
+        span.textContent = result.chunk.data;
+        pre.appendChild(span);
+        pre.scrollTop = pre.scrollHeight;
+        return;
+    }
+
     if (result.success) {
         const output = result.output || '(no output)';
+        const cacheNote = result.cache_hit ? ' (cached result)' : '';
+        const memoryNote = result.peak_rss_kb ? `, peak memory ${(result.peak_rss_kb / 1024).toFixed(1)} MB` : '';
         const executionTime = result.execution_time ? 
-            `\n\n--- Execution completed in ${DSLearningPlatform.formatExecutionTime(result.execution_time)} ---` : '';
+            `\n\n--- Execution completed in ${DSLearningPlatform.formatExecutionTime(result.execution_time)}${memoryNote}${cacheNote} ---` : '';
         
         outputContainer.innerHTML = `
             <div class="output-success d-inline-flex align-items-center mb-1" style="font-size:0.98rem;gap:0.4rem;padding:0 0.25rem 0 0;">
@@ -207,10 +431,65 @@ function displayExecutionResult(result) {
         DSLearningPlatform.showToast('Code execution failed', 'danger');
     }
     
+    if (result.profile) {
+        outputContainer.insertAdjacentHTML('beforeend', renderProfile(result.profile));
+    }
+
     // Add copy button to output
     addCopyButton(outputContainer);
 }
 
+/**
+ * Render a profile report as function and allocation tables
+ */
+function renderProfile(profile) {
+    const sanitize = DSLearningPlatform.sanitizeHTML;
+    const ms = seconds => (seconds * 1000).toFixed(2);
+    const kb = bytes => (bytes / 1024).toFixed(1);
+
+    const functionRows = profile.functions.map(row => `
+        <tr>
+            <td><code>${sanitize(row.function)}</code></td>
+            <td class="text-end">${row.calls === row.primitive_calls ? row.calls : `${row.calls}/${row.primitive_calls}`}</td>
+            <td class="text-end">${ms(row.self_time)}</td>
+            <td class="text-end">${ms(row.total_time)}</td>
+        </tr>
+    `).join('');
+
+    const allocationRows = profile.allocation_sites.map(site => `
+        <tr>
+            <td>line ${site.line}</td>
+            <td class="text-end">${kb(site.size_bytes)}</td>
+            <td class="text-end">${site.blocks}</td>
+        </tr>
+    `).join('');
+
+    return `
+        <div class="profile-report mt-3">
+            <h6><i class="fas fa-stopwatch me-2"></i>Profile</h6>
+            <div class="small text-muted mb-2">
+                Peak traced memory ${kb(profile.memory_peak_bytes)} KB,
+                ${profile.allocated_blocks} blocks still allocated at exit
+                (${kb(profile.memory_current_bytes)} KB).
+                Showing ${profile.functions.length} of ${profile.function_count} functions.
+            </div>
+            <table class="table table-sm table-striped small mb-3">
+                <thead>
+                    <tr><th>Function</th><th class="text-end">Calls</th><th class="text-end">Own ms</th><th class="text-end">Total ms</th></tr>
+                </thead>
+                <tbody>${functionRows}</tbody>
+            </table>
+            ${allocationRows ? `
+            <table class="table table-sm table-striped small mb-0">
+                <thead>
+                    <tr><th>Allocated at</th><th class="text-end">KB</th><th class="text-end">Blocks</th></tr>
+                </thead>
+                <tbody>${allocationRows}</tbody>
+            </table>` : ''}
+        </div>
+    `;
+}
+
 /**
  * Add copy button to output container
  */
@@ -190,6 +190,7 @@ function displayQuizResults(results) {
                         <h2 class="display-4 ${performance.colorClass}">${results.score}%</h2>
                         <h5 class="card-title">Your Score</h5>
                         <p class="text-muted">${results.correct_answers} out of ${results.total_questions} correct</p>
+                        <p class="text-muted small">${results.points_earned} of ${results.total_points} points</p>
                     </div>
                 </div>
             </div>
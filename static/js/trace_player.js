@@ -0,0 +1,211 @@
+// Execution trace player for the Data Structures Learning Platform
+// Replays the frames returned by /execute-code/trace: every frame only holds
+// what changed, so the full stack and heap are rebuilt once up front and the
+// player then steps through them.
+
+/**
+ * Create a player for a trace result inside container
+ */
+function initializeTracePlayer(container, code, result) {
+    const player = {
+        container: container,
+        lines: code.split('\n'),
+        output: result.output || '',
+        trace: result.trace,
+        states: buildTraceStates(result.trace.frames),
+        step: 0
+    };
+
+    if (!player.states.length) {
+        container.innerHTML = `
+            <div class="text-muted">
+                <i class="fas fa-info-circle me-2"></i>
+                Nothing to trace.
+            </div>
+        `;
+        return player;
+    }
+
+    container.innerHTML = `
+        <div class="d-flex align-items-center gap-2 mb-3">
+            <button class="btn btn-outline-secondary btn-sm" data-trace="first" title="First step"><i class="fas fa-fast-backward"></i></button>
+            <button class="btn btn-outline-secondary btn-sm" data-trace="prev" title="Previous step"><i class="fas fa-step-backward"></i></button>
+            <input type="range" class="form-range flex-grow-1" min="0" max="${player.states.length - 1}" value="0" data-trace="slider">
+            <button class="btn btn-outline-secondary btn-sm" data-trace="next" title="Next step"><i class="fas fa-step-forward"></i></button>
+            <button class="btn btn-outline-secondary btn-sm" data-trace="last" title="Last step"><i class="fas fa-fast-forward"></i></button>
+            <span class="small text-muted text-nowrap" data-trace="label"></span>
+        </div>
+        ${player.trace.truncated ? `
+        <div class="alert alert-warning py-1 small">
+            Only the first ${player.states.length} steps were recorded.
+        </div>` : ''}
+        <div class="row g-3">
+            <div class="col-md-5">
+                <pre class="trace-code small mb-2" style="max-height:360px;overflow:auto;" data-trace="code"></pre>
+                <pre class="small mb-0" style="max-height:120px;overflow:auto;" data-trace="output"></pre>
+            </div>
+            <div class="col-md-7" data-trace="state"></div>
+        </div>
+    `;
+
+    const goTo = step => {
+        player.step = Math.max(0, Math.min(player.states.length - 1, step));
+        renderTraceStep(player);
+    };
+    container.querySelector('[data-trace="first"]').addEventListener('click', () => goTo(0));
+    container.querySelector('[data-trace="prev"]').addEventListener('click', () => goTo(player.step - 1));
+    container.querySelector('[data-trace="next"]').addEventListener('click', () => goTo(player.step + 1));
+    container.querySelector('[data-trace="last"]').addEventListener('click', () => goTo(player.states.length - 1));
+    container.querySelector('[data-trace="slider"]').addEventListener('input', e => goTo(parseInt(e.target.value, 10)));
+
+    renderTraceStep(player);
+    return player;
+}
+
+/**
+ * Apply the delta-encoded frames in order, returning the full state
+ * ({line, event, exception, out, stack, heap, changed}) at every step.
+ * Unchanged frames and heap objects are shared between steps.
+ */
+function buildTraceStates(frames) {
+    const states = [];
+    let stack = [];
+    let heap = {};
+
+    frames.forEach(frame => {
+        stack = stack.slice(0, frame.depth);
+        (frame.frames || []).forEach(change => {
+            const previous = change.new || !stack[change.index] ?
+                { function: change.function, variables: {} } : stack[change.index];
+            const variables = Object.assign({}, previous.variables, change.set || {});
+            (change.del || []).forEach(name => delete variables[name]);
+            stack[change.index] = { function: previous.function, variables: variables };
+        });
+
+        if (frame.heap || frame.heap_del) {
+            heap = Object.assign({}, heap, frame.heap || {});
+            (frame.heap_del || []).forEach(ref => delete heap[ref]);
+        }
+
+        states.push({
+            line: frame.line,
+            event: frame.event,
+            exception: frame.exception,
+            out: frame.out,
+            stack: stack,
+            heap: heap,
+            changed: Object.keys(frame.heap || {})
+        });
+    });
+    return states;
+}
+
+/**
+ * Render the current step: highlighted source line, output so far,
+ * stack frames and heap objects
+ */
+function renderTraceStep(player) {
+    const state = player.states[player.step];
+    const container = player.container;
+    const sanitize = DSLearningPlatform.sanitizeHTML;
+
+    container.querySelector('[data-trace="slider"]').value = player.step;
+    container.querySelector('[data-trace="label"]').textContent =
+        `Step ${player.step + 1} of ${player.states.length}`;
+
+    const lineClass = state.event === 'exception' ? 'bg-danger text-white' :
+        state.event === 'return' ? 'bg-info text-dark' : 'bg-warning text-dark';
+    const codeElement = container.querySelector('[data-trace="code"]');
+    codeElement.innerHTML = player.lines.map((text, index) => {
+        const number = String(index + 1).padStart(3, ' ');
+        const current = index + 1 === state.line;
+        return `<span class="${current ? lineClass : ''}" ${current ? 'data-current="true"' : ''}>${number}  ${sanitize(text)}</span>`;
+    }).join('\n');
+    codeElement.querySelector('[data-current]')?.scrollIntoView({ block: 'nearest' });
+
+    container.querySelector('[data-trace="output"]').textContent = player.output.slice(0, state.out);
+
+    const frames = state.stack.slice().reverse().map((frame, position) => {
+        const rows = Object.entries(frame.variables).map(([name, value]) => `
+            <tr>
+                <td><code>${sanitize(name === '__return__' ? 'return value' : name)}</code></td>
+                <td>${renderTraceValue(value)}</td>
+            </tr>
+        `).join('');
+        return `
+            <div class="card mb-2 ${position === 0 ? 'border-warning' : ''}">
+                <div class="card-header py-1 small">${sanitize(frame.function === '<module>' ? 'Global frame' : frame.function + '()')}</div>
+                <table class="table table-sm small mb-0"><tbody>${rows || '<tr><td class="text-muted">no variables</td></tr>'}</tbody></table>
+            </div>
+        `;
+    }).join('');
+
+    const objects = Object.entries(state.heap).map(([ref, object]) => `
+        <div class="card mb-2 ${state.changed.includes(ref) ? 'border-info' : ''}" data-ref="${ref}">
+            <div class="card-header py-1 small">
+                <span class="badge bg-secondary me-1">#${ref}</span>${sanitize(object.class || object.type)}
+                ${object.length !== undefined ? `<span class="text-muted">(${object.length})</span>` : ''}
+            </div>
+            <div class="card-body p-1">${renderTraceObject(object)}</div>
+        </div>
+    `).join('');
+
+    container.querySelector('[data-trace="state"]').innerHTML = `
+        ${state.exception ? `<div class="alert alert-danger py-1 small">${sanitize(state.exception)}</div>` : ''}
+        <div class="row g-2">
+            <div class="col-sm-6"><h6 class="small text-muted">Frames</h6>${frames}</div>
+            <div class="col-sm-6"><h6 class="small text-muted">Objects</h6>${objects || '<div class="small text-muted">none</div>'}</div>
+        </div>
+    `;
+}
+
+/**
+ * Render one encoded value: inline Python literal, heap reference or repr
+ */
+function renderTraceValue(value) {
+    const sanitize = DSLearningPlatform.sanitizeHTML;
+    if (value === null) {
+        return 'None';
+    }
+    if (value === true || value === false) {
+        return value ? 'True' : 'False';
+    }
+    if (typeof value === 'string') {
+        return `<span class="text-success">'${sanitize(value)}'</span>`;
+    }
+    if (typeof value === 'number') {
+        return String(value);
+    }
+    if (value.ref !== undefined) {
+        return `<span class="badge bg-info text-dark">&rarr; #${value.ref}</span>`;
+    }
+    return `<span class="text-muted">${sanitize(value.repr)}</span>`;
+}
+
+/**
+ * Render a heap object: sequences as indexed cells, mappings and object
+ * fields as tables
+ */
+function renderTraceObject(object) {
+    const sanitize = DSLearningPlatform.sanitizeHTML;
+    const more = shown => object.length > shown ?
+        `<span class="text-muted small ms-1">&hellip; ${object.length - shown} more</span>` : '';
+
+    if (object.items) {
+        const cells = object.items.map((item, index) => `
+            <td class="text-center px-2">
+                <div class="text-muted" style="font-size:0.7em;">${object.type === 'set' || object.type === 'frozenset' ? '' : index}</div>
+                ${renderTraceValue(item)}
+            </td>
+        `).join('');
+        return `<table class="table table-bordered table-sm small mb-0 w-auto d-inline-table"><tr>${cells || '<td class="text-muted">empty</td>'}</tr></table>${more(object.items.length)}`;
+    }
+    if (object.entries) {
+        const rows = object.entries.map(([key, item]) =>
+            `<tr><td>${renderTraceValue(key)}</td><td>${renderTraceValue(item)}</td></tr>`).join('');
+        return `<table class="table table-sm small mb-0"><tbody>${rows || '<tr><td class="text-muted">empty</td></tr>'}</tbody></table>${more(object.entries.length)}`;
+    }
+    const rows = Object.entries(object.fields || {}).map(([name, item]) =>
+        `<tr><td><code>${sanitize(name)}</code></td><td>${renderTraceValue(item)}</td></tr>`).join('');
+    return `<table class="table table-sm small mb-0"><tbody>${rows || '<tr><td class="text-muted">no fields</td></tr>'}</tbody></table>`;
+}
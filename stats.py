@@ -0,0 +1,186 @@
+"""
+Materialized platform statistics for the admin dashboard.
+
+Totals live in StatCounter and per-day activity in DailyStats, both bumped in
+the same transaction as the write they count, so the dashboard reads a few
+rows instead of counting whole tables.  A background reconciler recounts the
+totals and the last few days from the source tables every
+STATS_RECONCILE_INTERVAL seconds, correcting any drift (rows deleted in bulk,
+writes from older code) and refreshing daily active users, which are not
+counted on write.  On a database without daily rows it backfills every day.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select, union
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import (User, UserProgress, QuizAttempt, CodeSubmission, StatCounter, DailyStats,
+                    QuizAttemptRollup, CodeSubmissionRollup)
+
+RECONCILE_INTERVAL = int(os.environ.get('STATS_RECONCILE_INTERVAL', 600))  # seconds; 0 disables
+RECONCILE_DAYS = int(os.environ.get('STATS_RECONCILE_DAYS', 2))  # recent days recounted each run
+DASHBOARD_DAYS = 14
+
+# Counter name -> DailyStats column it also adds to
+COUNTERS = {
+    'users': 'new_users',
+    'code_submissions': 'code_submissions',
+    'quiz_attempts': 'quiz_attempts',
+}
+
+# Counter name -> (model, timestamp column) it counts
+SOURCES = {
+    'users': (User, User.created_at),
+    'code_submissions': (CodeSubmission, CodeSubmission.timestamp),
+    'quiz_attempts': (QuizAttempt, QuizAttempt.timestamp),
+}
+
+# Counter name -> rollup column counting rows removed by retention (see retention.py)
+ROLLED_UP = {
+    'code_submissions': CodeSubmissionRollup.submissions,
+    'quiz_attempts': QuizAttemptRollup.attempts,
+}
+
+DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def increment(model, key, deltas):
+    """Add deltas to the row of model with primary key values key, creating it if missing"""
+    dialect_insert = DIALECT_INSERTS.get(db.engine.dialect.name)
+    table = model.__table__
+    if dialect_insert:
+        statement = dialect_insert(table).values(**key, **deltas)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={column: table.c[column] + statement.excluded[column] for column in deltas}
+        ))
+        return
+    updated = db.session.execute(
+        table.update().filter_by(**key).values({column: table.c[column] + delta
+                                                for column, delta in deltas.items()})
+    )
+    if not updated.rowcount:
+        db.session.add(model(**key, **deltas))
+
+
+def adjust_totals(**deltas):
+    """Add to the running totals, e.g. adjust_totals(quiz_attempts=-12); the caller commits"""
+    for name, delta in deltas.items():
+        if delta:
+            increment(StatCounter, {'name': name}, {'value': delta})
+
+
+def count_activity(**counts):
+    """Count new rows in the totals and today's DailyStats; the caller commits"""
+    counts = {name: count for name, count in counts.items() if count}
+    if not counts:
+        return
+    adjust_totals(**counts)
+    increment(DailyStats, {'day': datetime.utcnow().date()},
+              {COUNTERS[name]: count for name, count in counts.items()})
+
+
+def platform_stats(days=DASHBOARD_DAYS):
+    """Totals and the last days of DailyStats (newest first) for the dashboard"""
+    totals = dict.fromkeys(COUNTERS, 0)
+    totals.update(db.session.execute(select(StatCounter.name, StatCounter.value)).all())
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    daily = DailyStats.query.filter(DailyStats.day >= since).order_by(DailyStats.day.desc()).all()
+    return totals, daily
+
+
+def as_date(value):
+    # func.date() gives a string on SQLite and a date elsewhere
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def count_per_day(timestamp, since):
+    """{day: row count} since the given date, or over all time when since is None"""
+    day = func.date(timestamp)
+    query = db.session.query(day, func.count())
+    if since is not None:
+        query = query.filter(timestamp >= datetime.combine(since, datetime.min.time()))
+    return {as_date(value): count for value, count in query.group_by(day).all()}
+
+
+def rolled_up_per_day(name, since):
+    """{day: rows removed by retention} of a counter, as count_per_day"""
+    if name not in ROLLED_UP:
+        return {}
+    column = ROLLED_UP[name]
+    day = column.class_.day
+    query = db.session.query(day, func.sum(column))
+    if since is not None:
+        query = query.filter(day >= since)
+    return {as_date(value): int(count) for value, count in query.group_by(day).all()}
+
+
+def active_users_per_day(since):
+    """{day: distinct accounts and anonymous sessions with any recorded activity}"""
+    activity = []
+    for model in (CodeSubmission, QuizAttempt, UserProgress):
+        statement = select(func.date(model.timestamp).label('day'), model.user_id, model.session_id)
+        if since is not None:
+            statement = statement.where(model.timestamp >= datetime.combine(since, datetime.min.time()))
+        activity.append(statement)
+    visitors = union(*activity).subquery()
+    rows = db.session.execute(select(visitors.c.day, func.count()).group_by(visitors.c.day)).all()
+    return {as_date(day): count for day, count in rows if day is not None}
+
+
+def reconcile_stats(days=RECONCILE_DAYS):
+    """
+    Recount the totals and the DailyStats of the last days from the source
+    tables and the retention rollups (every day if DailyStats is empty) and
+    store the true values
+    """
+    for name, (model, _) in SOURCES.items():
+        rolled_up = sum(rolled_up_per_day(name, None).values())
+        db.session.merge(StatCounter(name=name, value=model.query.count() + rolled_up))
+
+    since = None
+    if DailyStats.query.first() is not None:
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+    counts = {}
+    for name, (_, timestamp) in SOURCES.items():
+        per_day = count_per_day(timestamp, since)
+        for day, count in rolled_up_per_day(name, since).items():
+            per_day[day] = per_day.get(day, 0) + count
+        counts[COUNTERS[name]] = per_day
+    counts['active_users'] = active_users_per_day(since)
+
+    recounted = set().union(*counts.values())
+    if since is not None:
+        # Days whose rows have all gone still need their counts zeroed
+        recounted.update(since + timedelta(days=offset) for offset in range(days))
+    for day in sorted(recounted):
+        db.session.merge(DailyStats(day=day, **{column: per_day.get(day, 0)
+                                                for column, per_day in counts.items()}))
+    db.session.commit()
+
+
+def start_reconciler(app):
+    """Reconcile now and then every RECONCILE_INTERVAL seconds in a background thread"""
+    if RECONCILE_INTERVAL <= 0:
+        return
+
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    reconcile_stats()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Statistics reconcile failed: {str(e)}")
+            time.sleep(RECONCILE_INTERVAL)
+
+    threading.Thread(target=run, name='stats-reconciler', daemon=True).start()
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, Rejected
+
+
+def controller(**overrides):
+    settings = dict(max_in_flight=4, max_queue_depth=10, per_key_limit=2, rate=1, burst=5)
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+
+def test_cost_above_burst_is_refused_not_capped():
+    admission = controller()
+    with pytest.raises(ValueError):
+        admission.admit('visitor', cost=6)
+
+
+def test_cost_uses_one_token_per_snippet():
+    admission = controller()
+    admission.admit('visitor', cost=5).release()
+    with pytest.raises(Rejected):
+        admission.admit('visitor')
+
+
+def test_batch_holds_one_slot_per_snippet():
+    admission = controller(per_key_limit=4)
+    with admission.admit('batch', cost=3, slots=3) as batch:
+        assert batch.slots == 3
+        assert admission.stats()['in_flight'] == 3
+        with admission.admit('other'):
+            assert admission.stats()['in_flight'] == 4
+
+            started = threading.Event()
+            waiting = admission.admit('another')
+            thread = threading.Thread(target=lambda: waiting.run(started.set))
+            thread.start()
+            # No slot is free until one of the running tickets finishes
+            assert not started.wait(0.1)
+        thread.join(1)
+        assert started.is_set()
+    assert admission.stats()['in_flight'] == 0
+
+
+def test_slots_are_capped_at_max_in_flight():
+    admission = controller(max_in_flight=2)
+    ticket = admission.admit('visitor', cost=5, slots=5)
+    assert ticket.slots == 2
+    ticket.release()
+
+
+def test_waiting_batch_is_not_overtaken_by_single_runs():
+    admission = controller(max_in_flight=2, per_key_limit=10, burst=10)
+    order = []
+    first = admission.admit('a')
+    first.__enter__()
+
+    batch = admission.admit('batch', cost=2, slots=2)
+    batch_thread = threading.Thread(target=lambda: batch.run(lambda: order.append('batch')))
+    batch_thread.start()
+    while not admission._starting:
+        time.sleep(0.001)
+
+    # One slot is free, but the batch ahead needs both
+    single = admission.admit('b')
+    single_thread = threading.Thread(target=lambda: single.run(lambda: order.append('single')))
+    single_thread.start()
+    single_thread.join(0.1)
+    assert order == []
+
+    first.__exit__(None, None, None)
+    batch_thread.join(1)
+    single_thread.join(1)
+    assert order == ['batch', 'single']
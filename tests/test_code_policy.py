@@ -0,0 +1,116 @@
+import importlib
+import types
+
+import pytest
+
+from code_policy import ALLOWED_MODULES, analyze, is_forbidden_attribute
+
+
+ALLOWED = [
+    'def reopen(files):\n    return files',
+    'files = ["a", "b"]\nfor file in files:\n    print(file)',
+    '# open("/etc/passwd")\nprint("eval(x) and import os are only text")',
+    'from collections import deque, defaultdict\nimport heapq',
+    'import json\nprint(json.dumps({"a": 1}))',
+    'import string\nprint(string.ascii_lowercase)',
+    'class Node:\n    def __init__(self, value):\n        self.value = value\n        self.next = None\n'
+    '    def __repr__(self):\n        return f"Node({self.value})"',
+    'from functools import lru_cache\n@lru_cache(maxsize=None)\ndef fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)',
+    'from typing import List, Optional\ndef first(items: List[int]) -> Optional[int]:\n    return items[0] if items else None',
+    'from dataclasses import dataclass\n@dataclass\nclass Edge:\n    to: int\n    weight: float = 1.0',
+    'print(getattr(object(), "missing", None))',
+    'from operator import attrgetter, itemgetter\nprint(sorted([(1, 2)], key=itemgetter(1)))',
+    'import operator\nprint(operator.attrgetter("real")(1))',
+]
+
+REJECTED = [
+    'from os import system',
+    'import os',
+    'import os.path',
+    'import codecs\ncodecs.open("/etc/hostname").read()',
+    'import linecache\nlinecache.getline("/etc/hostname", 1)',
+    'import gzip',
+    'import zipfile',
+    'import tarfile',
+    'import io',
+    'import importlib',
+    'len.__self__.open("/etc/hostname").read()',
+    "len.__self__.__dict__['__im' + 'port__']('os')",
+    'print.__getattribute__("__self__")',
+    'object.__subclasses__()',
+    'open("/etc/hostname")',
+    'f = open\nf("/etc/hostname")',
+    'eval("1 + 1")',
+    'import random\nrandom._os.system("true")',
+    'import typing\ntyping.sys.modules',
+    'import json\njson.codecs.open("/etc/hostname")',
+    'import string\nstring.Formatter().get_field("0.__self__", [len], {})',
+    'from string import Formatter',
+    'getattr(len, "__se" + "lf__")',
+    'getattr(len, *["__self__"])',
+    'g = getattr\ng(len, "__self__")',
+    'from operator import attrgetter as get\nget("__self__")(len)',
+    'import operator\noperator.attrgetter("__self__")(len)',
+    'import operator\noperator.attrgetter("__self__.open")(len)',
+    'import operator\noperator.methodcaller("__getattribute__", "__self__")(len)',
+    'import operator\nget = operator.attrgetter',
+    'import typing\ntyping.ForwardRef("__import__(\'os\').listdir(\'/\')")._evaluate(None, None, frozenset())',
+    'import dataclasses\ndataclasses._create_fn("f", [], ["return __import__(\'os\').getuid()"], globals={})()',
+    'import typing\ndef f(x: "__import__(\'os\').getpid()"):\n    pass\ntyping.get_type_hints(f)',
+    'import functools\n@functools.singledispatch\ndef g(x):\n    pass\n'
+    '@g.register\ndef _(x: "__import__(\'os\').getpid()"):\n    pass',
+    'from functools import singledispatch',
+    'from typing import *',
+    'def f(x):\n    pass\nf.__annotations__ = {"x": "__import__(\'os\')"}',
+    'getattr(object(), "_private")',
+    'class Node:\n    def __init__(self):\n        self._next = None',
+]
+
+
+@pytest.mark.parametrize('code', ALLOWED)
+def test_allowed(code):
+    verdict = analyze(code)
+    assert verdict.allowed, verdict.error
+
+
+@pytest.mark.parametrize('code', REJECTED)
+def test_rejected(code):
+    verdict = analyze(code)
+    assert not verdict.allowed
+    assert verdict.error.startswith('Security restriction:')
+
+
+def test_syntax_error_is_reported_like_the_sandbox():
+    verdict = analyze('def f(:\n    pass')
+    assert not verdict.allowed
+    assert 'SyntaxError' in verdict.error
+
+
+def test_allowed_modules_do_not_expose_other_modules():
+    # Every module an allowed module (or its submodules) keeps as an attribute
+    # must be allowed too, or its attribute name forbidden
+    exposed = {}
+    seen = set()
+    pending = [importlib.import_module(name) for name in ALLOWED_MODULES]
+    while pending:
+        module = pending.pop()
+        if module.__name__ in seen:
+            continue
+        seen.add(module.__name__)
+        for attribute, value in vars(module).items():
+            if not isinstance(value, types.ModuleType):
+                continue
+            if value.__name__.split('.')[0] in ALLOWED_MODULES:
+                pending.append(value)
+            elif not is_forbidden_attribute(attribute):
+                exposed[f'{module.__name__}.{attribute}'] = value.__name__
+    assert not exposed
+
+
+def test_imports_of_changing_modules_are_not_deterministic():
+    assert analyze('print(sorted([3, 1, 2]))').deterministic
+    assert not analyze('import random\nprint(random.random())').deterministic
+
+
+def test_id_is_not_deterministic():
+    assert not analyze('print(id([]))').deterministic
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+
+@pytest.fixture(scope='module')
+def app_db(tmp_path_factory):
+    """The app and db on an empty SQLite database, background jobs off"""
+    path = tmp_path_factory.mktemp('db') / 'progress.db'
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    for name in ('PRECOMPUTE_EXAMPLES', 'STATS_RECONCILE_INTERVAL', 'RETENTION_INTERVAL'):
+        os.environ[name] = '0'
+    from app import app, db
+    if app.config['SQLALCHEMY_DATABASE_URI'] != os.environ['DATABASE_URL']:
+        pytest.skip('app was already imported against another database')
+    return app, db
+
+
+def query_plan(db, statement):
+    """SQLite's plan for statement, one line per step"""
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    with db.engine.connect() as connection:
+        rows = connection.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).fetchall()
+    return [str(row[-1]) for row in rows]
+
+
+@pytest.mark.parametrize('owner, value', [('session_id', 'abc'), ('user_id', 1)])
+def test_progress_lookup_uses_index(app_db, owner, value):
+    app, db = app_db
+    from models import UserProgress
+
+    with app.app_context():
+        lookup = db.select(UserProgress).filter_by(**{owner: value}, module_name='theory',
+                                                   section_name='arrays')
+        plan = query_plan(db, lookup)
+    assert any('ix_user_progress_' in step for step in plan), plan